@@ -0,0 +1,275 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+import Xavier_COM6031_Events as events
+import Xavier_COM6031_Scenario1 as scenario1
+import Xavier_COM6031_Scenario2 as scenario2
+import Xavier_COM6031_Scenario6 as scenario6
+import Xavier_COM6031_Scenario8 as scenario8
+
+class Benchmark():
+    """Benchmark of one parameterised workload.
+
+    The workload is timed call by call for latency percentiles and throughput, then run once more under
+    tracemalloc for peak memory, and optionally once more under cProfile.
+    """
+    def __init__(self, name, params, setup, run):
+        """Initialise benchmark
+
+        Args:
+            name (string): Name of the benchmark
+            params (dict): Workload parameters, reported with the results
+            setup (function): Returns the state the workload runs on, untimed
+            run (function): Workload timed on each call, given the state
+        """
+        self._name = name
+        self._params = params
+        self._setup = setup
+        self._run = run
+
+    def Measure(self, repeat, profile_directory=None):
+        """Measure the workload
+
+        Args:
+            repeat (int): Number of timed calls
+            profile_directory (path): Directory to write a cProfile capture to, None to skip profiling
+
+        Returns:
+            dict: Name, parameters, calls per second (None if too fast to time), latency percentiles in seconds, and peak memory in bytes
+        """
+        state = self._setup()
+        self._run(state)                                    # Warm up caches before timing
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self._run(state)
+            latencies.append(time.perf_counter() - start)
+
+        state = self._setup()                               # Fresh state so memory includes the workload's own allocations
+        tracemalloc.start()
+        self._run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if profile_directory is not None:
+            profiler = cProfile.Profile()
+            profiler.runcall(self._run, self._setup())
+            profiler.dump_stats(os.path.join(profile_directory, f'{self._name}.prof'))
+
+        latencies.sort()
+        return {
+            "name": self._name,
+            "params": self._params,
+            "ops_per_sec": repeat / sum(latencies) if sum(latencies) else None,   # Infinity is not valid JSON
+            "latency": {"min": latencies[0], "p50": _Percentile(latencies, 50), "p90": _Percentile(latencies, 90),
+                        "p99": _Percentile(latencies, 99), "max": latencies[-1]},
+            "peak_memory": peak,
+        }
+
+def _Percentile(ordered, percent):
+    """Nearest-rank percentile of sorted values"""
+    return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+def Scenario1Benchmarks(products, directory):
+    """Document build, View and Save with the given number of products"""
+    def Build(factory):
+        document = factory.CreateDocument("Benchmark")
+        for index in range(products):
+            if index % 2:
+                document.AddContent(factory.CreateText(f'Block {index}'))
+            else:
+                document.AddContent(factory.CreateImage("path/to/logo/", 100, 50))
+        return document
+
+    def View(document):
+        with redirect_stdout(io.StringIO()):
+            document.View()
+
+    path = os.path.join(directory, "scenario1.txt")
+    return [
+        Benchmark("scenario1.build", {"products": products}, scenario1.PDFFactory, Build),
+        Benchmark("scenario1.view", {"products": products}, lambda: Build(scenario1.PDFFactory()), View),
+        Benchmark("scenario1.save", {"products": products}, lambda: Build(scenario1.WordFactory()), lambda document: document.Save(path)),
+    ]
+
+def Scenario2Benchmarks(subscribers, executor):
+    """SetPremium fan-out across the given number of plain and threshold subscribers, in turn, batched and through an executor"""
+    def Plain():
+        company = scenario2.InsuranceCompany(100)
+        company.AddSubs(scenario2.GenericSubscriberInterface() for _ in range(subscribers))
+        return company
+
+    def Threshold():
+        company = scenario2.InsuranceCompany(100)
+        company.AddSubs(_QuietThresholdSubscriber(random.uniform(0, 1000)) for _ in range(subscribers))
+        company.SetPremium(100)
+        return company
+
+    def Batched():
+        company = Plain()
+        company.SetBatching(count=100)
+        return company
+
+    def Concurrent():
+        company = Plain()
+        company.SetExecutor(executor, timeout=1)
+        return company
+
+    def Revise(company):
+        company.SetPremium(company.GetPremium() + random.choice((-1, 1)))
+
+    def ReviseMany(company):
+        for _ in range(100):                            # A burst filling one batch
+            Revise(company)
+
+    return [
+        Benchmark("scenario2.set_premium", {"subscribers": subscribers}, Plain, Revise),
+        Benchmark("scenario2.set_premium_threshold", {"subscribers": subscribers}, Threshold, Revise),
+        Benchmark("scenario2.set_premium_burst", {"subscribers": subscribers, "updates": 100}, Plain, ReviseMany),
+        Benchmark("scenario2.set_premium_burst_batched", {"subscribers": subscribers, "updates": 100}, Batched, ReviseMany),
+        Benchmark("scenario2.set_premium_executor", {"subscribers": subscribers}, Concurrent, Revise),
+    ]
+
+class _QuietThresholdSubscriber(scenario2.ThresholdSubscriberInterface):
+    """Threshold subscriber doing no work on update"""
+    def Update(self, data):
+        pass
+
+def Scenario6Benchmarks(width, depth):
+    """Tree build, CalculateSize and aggregation on a tree of the given width and depth"""
+    def Build():
+        root = scenario6.Folder()
+        level = [root]
+        for _ in range(depth):
+            next_level = []
+            for folder in level:
+                for _ in range(width):
+                    child = scenario6.Folder()
+                    folder.AddChild(child)
+                    folder.AddChild(scenario6.File(1))
+                    next_level.append(child)
+            level = next_level
+        return root
+
+    def Compact():
+        return scenario6.CompactTree.FromComponent(Build())
+
+    params = {"width": width, "depth": depth}
+    return [
+        Benchmark("scenario6.build", params, lambda: None, lambda _: Build()),
+        Benchmark("scenario6.calculate_size", params, Build, lambda root: root.CalculateSize()),
+        Benchmark("scenario6.aggregate", params, Build, lambda root: root.Aggregate(top=10)),
+        Benchmark("scenario6.compact_recalculate", params, Compact, lambda tree: tree.Recalculate()),
+    ]
+
+def Scenario8Benchmarks(tickets, length, workers):
+    """Routing throughput over a synthetic corpus of tickets of the given length, one at a time and in bulk"""
+    words = ["please", "help", "the", "printer", "is", "broken", "again", "error", "issue", "warning", "feature", "critical", "coffee"]
+    corpus = [" ".join(random.choice(words[:7] if index % 4 == 3 else words) for _ in range(length // 6)) for index in range(tickets)]
+
+    def Chain():
+        return scenario8.Level1(scenario8.Level2(scenario8.Level3(scenario8.DefaultHandler(None))))
+
+    def Rules():
+        return scenario8.RulesTicketRouter(scenario8.RoutingRules.FromChain(Chain()))
+
+    def RouteAll(router):
+        for ticket in corpus:
+            router.Route(ticket)
+
+    def RouteMany(router):
+        deque(router.RouteMany(corpus, workers=workers), maxlen=0)     # Consume every result
+
+    params = {"tickets": tickets, "length": length}
+    return [
+        Benchmark("scenario8.route_chain", params, Chain, RouteAll),
+        Benchmark("scenario8.route_compiled", params, lambda: Chain().Compile(), RouteAll),
+        Benchmark("scenario8.route_cached", params, lambda: scenario8.CachedTicketRouter(Chain().Compile()), RouteAll),
+        Benchmark("scenario8.route_rules", params, Rules, RouteAll),
+        Benchmark("scenario8.route_many", dict(params, workers=workers), lambda: Chain().Compile(), RouteMany),
+        Benchmark("scenario8.route_many_rules", dict(params, workers=workers), Rules, RouteMany),
+    ]
+
+def Compare(results, baseline):
+    """Compare results against a baseline run
+
+    Args:
+        results (dict): Results of this run
+        baseline (dict): Results of an earlier run
+
+    Returns:
+        list: (name, baseline ops/sec, ops/sec, speed-up) for benchmarks with matching names and parameters, timed in both runs
+    """
+    earlier = {(result["name"], json.dumps(result["params"], sort_keys=True)): result for result in baseline["results"]}
+    comparison = []
+    for result in results["results"]:
+        before = earlier.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if before is not None and before["ops_per_sec"] and result["ops_per_sec"]:
+            comparison.append((result["name"], before["ops_per_sec"], result["ops_per_sec"], result["ops_per_sec"] / before["ops_per_sec"]))
+    return comparison
+
+def Run(benchmarks, repeat, profile_directory=None):
+    """Measure every benchmark with feedback events silenced
+
+    Returns:
+        dict: Environment details and the result of each benchmark
+    """
+    sink = events.GetSink()
+    events.SetSink(events.NullSink())
+    try:
+        results = [benchmark.Measure(repeat, profile_directory) for benchmark in benchmarks]
+    finally:
+        events.SetSink(sink)
+    return {"python": platform.python_version(), "platform": platform.platform(), "timestamp": time.time(), "repeat": repeat, "results": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the four pattern scenarios")
+    parser.add_argument("--scenarios", nargs="+", default=["1", "2", "6", "8"], help="Scenarios to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per benchmark")
+    parser.add_argument("--products", type=int, default=1000, help="Scenario 1 products per document")
+    parser.add_argument("--subscribers", type=int, default=10000, help="Scenario 2 subscribers per publisher")
+    parser.add_argument("--width", type=int, default=4, help="Scenario 6 folders per folder")
+    parser.add_argument("--depth", type=int, default=6, help="Scenario 6 tree depth")
+    parser.add_argument("--tickets", type=int, default=1000, help="Scenario 8 tickets per corpus")
+    parser.add_argument("--length", type=int, default=500, help="Scenario 8 approximate ticket length")
+    parser.add_argument("--workers", type=int, default=2, help="Scenario 2 executor threads and Scenario 8 RouteMany processes, 0 to route in this process")
+    parser.add_argument("--seed", type=int, default=6031, help="Random seed for synthetic workloads")
+    parser.add_argument("--profile", help="Directory to write cProfile captures to")
+    parser.add_argument("--output", default="bench_output.json", help="JSON results file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    arguments = parser.parse_args()
+
+    random.seed(arguments.seed)
+    if arguments.profile:
+        os.makedirs(arguments.profile, exist_ok=True)
+    with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(arguments.workers or 1) as executor:
+        suites = {
+            "1": lambda: Scenario1Benchmarks(arguments.products, directory),
+            "2": lambda: Scenario2Benchmarks(arguments.subscribers, executor),
+            "6": lambda: Scenario6Benchmarks(arguments.width, arguments.depth),
+            "8": lambda: Scenario8Benchmarks(arguments.tickets, arguments.length, arguments.workers),
+        }
+        benchmarks = [benchmark for scenario in arguments.scenarios for benchmark in suites[scenario]()]
+        results = Run(benchmarks, arguments.repeat, arguments.profile)
+
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+    for result in results["results"]:
+        ops_per_sec = f'{result["ops_per_sec"]:>12.1f}' if result["ops_per_sec"] else f'{"-":>12}'
+        print(f'{result["name"]:<36} {ops_per_sec} ops/s  p50 {result["latency"]["p50"] * 1e3:>9.3f} ms  '
+              f'p99 {result["latency"]["p99"] * 1e3:>9.3f} ms  peak {result["peak_memory"] / 1024:>10.1f} KiB')
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            for name, before, after, ratio in Compare(results, json.load(file)):
+                print(f'{name:<36} {before:>12.1f} -> {after:>12.1f} ops/s  ({ratio:.2f}x)')
@@ -0,0 +1,126 @@
+import json
+import threading
+
+class EventSink():
+    """Generic Event Sink Interface receiving the events of every scenario.
+
+    Events are given as a name, a message template and the fields to fill it with, so the
+    message is only formatted by sinks that actually consume it.
+    """
+    def Emit(self, event, template, **fields):
+        """Receive an event, to be overridden by child classes
+
+        Args:
+            event (string): Name of the event, e.g. "AddSub"
+            template (string): str.format template of the human readable message
+            **fields: Values of the event, used to fill the template
+        """
+        pass
+
+    def Flush(self):
+        """Write out any buffered events"""
+        pass
+
+class ConsoleSink(EventSink):
+    """Sink printing each event's message to the console as it happens (the default)"""
+    def Emit(self, event, template, **fields):
+        """Print the formatted message"""
+        print(template.format(**fields))   # Print feedback to the console
+
+class NullSink(EventSink):
+    """Sink discarding every event, with no formatting cost"""
+    def Emit(self, event, template, **fields):
+        """Discard the event"""
+        pass
+
+class BufferedSink(EventSink):
+    """Sink keeping events in memory, unformatted, until they are asked for"""
+    def __init__(self, max_events=None):
+        """Initialise empty buffer
+
+        Args:
+            max_events (int): Number of most recent events to keep, None to keep every event
+        """
+        self._events = []                   # (event, template, fields) of each event
+        self._max_events = max_events       # Bound on kept events
+
+    def Emit(self, event, template, **fields):
+        """Keep the event, dropping the oldest if the buffer is full"""
+        self._events.append((event, template, fields))
+        if self._max_events is not None and len(self._events) > self._max_events:
+            del self._events[:len(self._events) - self._max_events]
+
+    def GetEvents(self):
+        """Get the kept events
+
+        Returns:
+            list: (event, template, fields) of each event, oldest first
+        """
+        return list(self._events)
+
+    def GetMessages(self):
+        """Format the kept events' messages
+
+        Returns:
+            list: Message of each event, oldest first
+        """
+        return [template.format(**fields) for _, template, fields in self._events]
+
+    def Clear(self):
+        """Drop every kept event"""
+        self._events.clear()
+
+class JSONLinesSink(EventSink):
+    """Sink writing events as JSON lines, in batches. Field values that are not JSON types are written as strings."""
+    def __init__(self, file, batch_size=1000):
+        """Initialise empty batch
+
+        Args:
+            file (file): Text file to write to, e.g. opened with open(path, "w")
+            batch_size (int): Number of events written at a time
+        """
+        self._file = file                   # Destination of the JSON lines
+        self._batch_size = batch_size       # Events per write
+        self._batch = []                    # (event, fields) waiting to be written
+        self._lock = threading.Lock()       # Events may come from notification or scanning threads
+
+    def Emit(self, event, template, **fields):
+        """Queue the event, writing the batch once full"""
+        with self._lock:
+            self._batch.append((event, fields))
+            if len(self._batch) >= self._batch_size:
+                self._Write()
+
+    def Flush(self):
+        """Write every queued event"""
+        with self._lock:
+            self._Write()
+            self._file.flush()
+
+    def _Write(self):
+        """Serialise the batch in a single write"""
+        if self._batch:
+            self._file.write("".join(json.dumps({"event": event, **fields}, default=str) + "\n" for event, fields in self._batch))
+            self._batch = []
+
+_sink = ConsoleSink()       # Sink receiving every event
+Emit = _sink.Emit           # Bound straight to the current sink's Emit, so emitting costs a single call
+
+def SetSink(sink):
+    """Send every scenario's events to a sink. Call sites use Xavier_COM6031_Events.Emit, so the change applies everywhere.
+
+    Args:
+        sink (EventSink): Sink to receive events, e.g. NullSink() to silence every scenario
+    """
+    global _sink, Emit
+    _sink.Flush()           # Write out anything the old sink is holding
+    _sink = sink
+    Emit = sink.Emit
+
+def GetSink():
+    """Get the current sink
+
+    Returns:
+        EventSink: Sink receiving events
+    """
+    return _sink
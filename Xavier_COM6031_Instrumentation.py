@@ -0,0 +1,140 @@
+import json
+import time
+from array import array
+
+_BUCKETS = 64               # Latency histogram buckets, bucket b counts calls taking under 2**b ns
+
+enabled = False             # Checked by every instrumented call site before doing any work
+_sample_every = 1           # Time one call in this many
+_probes = {}                # Name -> Probe
+
+class Probe():
+    """Counters and a sampled latency histogram for one instrumented call site.
+
+    Storage is preallocated, so recording a call never allocates. Counts are updated without locking,
+    so calls made concurrently from several threads may occasionally be missed.
+    """
+    __slots__ = ("_name", "_calls", "_labels", "_sampled", "_total_ns", "_histogram")
+
+    def __init__(self, name):
+        """Initialise empty counters
+
+        Args:
+            name (string): Name of the call site, e.g. "Folder.CalculateSize"
+        """
+        self._name = name
+        self._calls = 0                                 # Calls made
+        self._labels = {}                               # Label -> calls, e.g. per handler level
+        self._sampled = 0                               # Calls timed
+        self._total_ns = 0                              # Total time of the timed calls
+        self._histogram = array('Q', bytes(8 * _BUCKETS))   # Timed calls per power-of-two latency bucket
+
+    def Call(self, label, function, *args):
+        """Count a call, timing it if it is sampled
+
+        Args:
+            label (string): Label to count the call under, None for no label
+            function (function): Function being instrumented
+            *args: Arguments to call function with
+
+        Returns:
+            object: Result of the function
+        """
+        self._calls += 1
+        if label is not None:
+            self._labels[label] = self._labels.get(label, 0) + 1
+        if self._calls % _sample_every:                 # Not sampled, call without timing
+            return function(*args)
+        start = time.perf_counter_ns()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self._sampled += 1
+            self._total_ns += elapsed
+            self._histogram[min(elapsed.bit_length(), _BUCKETS - 1)] += 1
+
+    def Count(self, label):
+        """Count an event under a label, without timing anything
+
+        Args:
+            label (string): Label to count under
+        """
+        self._labels[label] = self._labels.get(label, 0) + 1
+
+    def Snapshot(self):
+        """Copy the probe's counters
+
+        Returns:
+            dict: Calls, label counts, timed calls, mean latency in ns, and the latency histogram as {bucket upper bound in ns: calls}
+        """
+        return {
+            "calls": self._calls,
+            "labels": dict(self._labels),
+            "sampled": self._sampled,
+            "mean_ns": self._total_ns / self._sampled if self._sampled else None,
+            "histogram": {2 ** bucket: count for bucket, count in enumerate(self._histogram) if count},
+        }
+
+    def Reset(self):
+        """Zero the probe's counters"""
+        self._calls = self._sampled = self._total_ns = 0
+        self._labels.clear()
+        for bucket in range(_BUCKETS):
+            self._histogram[bucket] = 0
+
+def GetProbe(name):
+    """Get the probe of a call site, creating it on first use
+
+    Args:
+        name (string): Name of the call site
+
+    Returns:
+        Probe: Probe of the call site
+    """
+    probe = _probes.get(name)
+    if probe is None:
+        probe = _probes[name] = Probe(name)
+    return probe
+
+def Enable(sample_every=1):
+    """Start instrumenting every call site
+
+    Args:
+        sample_every (int): Time one call in this many, every call is still counted
+
+    Raises:
+        ValueError: If sample_every is less than 1
+    """
+    global enabled, _sample_every
+    if not sample_every >= 1:
+        raise ValueError(f'sample_every must be at least 1, not {sample_every}')
+    _sample_every = sample_every
+    enabled = True
+
+def Disable():
+    """Stop instrumenting. Call sites then only check the enabled flag."""
+    global enabled
+    enabled = False
+
+def Reset():
+    """Zero every probe's counters"""
+    for probe in _probes.values():
+        probe.Reset()
+
+def Snapshot():
+    """Copy every probe's counters
+
+    Returns:
+        dict: Call site name -> Probe.Snapshot()
+    """
+    return {name: probe.Snapshot() for name, probe in _probes.items()}
+
+def Export(path):
+    """Write a snapshot of every probe as JSON
+
+    Args:
+        path (path): File to write
+    """
+    with open(path, "w") as file:
+        json.dump(Snapshot(), file, indent=2)
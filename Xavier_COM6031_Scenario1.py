@@ -1,5 +1,80 @@
+import os
+import shutil
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import Xavier_COM6031_Events as events
+import Xavier_COM6031_Instrumentation as instrumentation
+
+_CHUNK_SIZE = 1 << 16   # Size of each write to, and read from, document files
+
+ImageData = namedtuple("ImageData", ["path", "width", "height"])   # Immutable image state shared between image products
+
+class FlyweightPool():
+    """Interning pool so equal immutable product data is stored once and shared between products.
+
+    The pool holds a bounded number of values and evicts the least recently used, which only stops
+    future products sharing them; products already holding a value keep it.
+    """
+    def __init__(self, max_size=4096):
+        """Initialise empty pool
+
+        Args:
+            max_size (int): Maximum number of values held by the pool
+        """
+        self._values = OrderedDict()    # (value, types) -> canonical equal value, least recently used first
+        self._max_size = max_size       # Bound on pooled values
+
+    def Intern(self, value):
+        """Get the shared value equal to value and of the same types, pooling value if there is none
+
+        Args:
+            value (hashable): Immutable product data
+
+        Returns:
+            hashable: Shared equal value
+        """
+        key = (value, _Types(value))                # Equal values of different types render differently, e.g. 100 and 100.0
+        shared = self._values.get(key)
+        if shared is not None:
+            self._values.move_to_end(key)           # Mark as most recently used
+            return shared
+        self._values[key] = value
+        if len(self._values) > self._max_size:
+            self._values.popitem(last=False)        # Evict the least recently used value
+        return value
+
+    def GetSize(self):
+        """Get number of pooled values
+
+        Returns:
+            int: Number of values held by the pool
+        """
+        return len(self._values)
+
+def _Types(value):
+    """Types of a value, and of its fields if it is a tuple"""
+    if isinstance(value, tuple):
+        return type(value), tuple(type(field) for field in value)
+    return type(value)
+
+_flyweights = FlyweightPool()   # Pool shared by the products of every factory
+
+def SetFlyweightPool(pool):
+    """Replace the pool products share their data through
+
+    Args:
+        pool (FlyweightPool): New pool
+    """
+    global _flyweights
+    _flyweights = pool
+
 class AbstractDocument():
     """Abstract Document Interface."""
+    __slots__ = ("_filename", "_content", "_stream", "_stream_path", "_stream_saved", "_rendered", "_positions", "_stale")
+
     def __init__(self, filename):
         """Initialise contents and filename.
 
@@ -8,6 +83,119 @@ class AbstractDocument():
         """
         self._filename = filename   # Initialise filename
         self._content = []          # Initialise document content
+        self._stream = None         # Open file content is appended to, in append mode
+        self._stream_path = None    # Path of the file written in append mode, open or finished
+        self._stream_saved = False  # Whether the append mode file has been moved to where it was saved
+        self._rendered = []         # Cached renderings of the first len(_rendered) products
+        self._positions = {}        # Product -> indices of the product in the content
+        self._stale = set()         # Indices of cached renderings whose product has changed
+
+    def OpenStream(self, filepath):
+        """Switch to append mode: content is written to the file as it is added, rather than held in memory.
+
+        Each product is rendered when it is added, so later changes to it are not reflected in the document.
+        The file is finished by Save or Close, after which no more content can be added.
+
+        Args:
+            filepath (path): file path to stream the document to.
+        """
+        self.Close()                                    # Finish any file already being streamed to
+        self._stream_saved = False
+        self._stream = open(filepath, "w", encoding="utf-8", buffering=_CHUNK_SIZE)    # Buffered, so written in chunks
+        self._stream_path = filepath
+        self._stream.write(self._Header())
+        for content in self._content:                   # Write out anything added before streaming
+            self._stream.write(str(content))
+        self._content = []
+        self._rendered = []
+        self._positions = {}
+        self._stale = set()
+
+    def Close(self):
+        """Finish and close the file of a document in append mode. The document can still be viewed and saved."""
+        if self._stream is not None:
+            self._stream.write("\n")
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        """Use the document as a context manager, closing its file in append mode on exit"""
+        return self
+
+    def __exit__(self, *exception):
+        """Close the document's file in append mode"""
+        self.Close()
+
+    def _Header(self):
+        """Render document metadata, to be overridden by child classes"""
+        return f'Filename: {self._filename} \nContents: \n'
+
+    def _Add(self, content):
+        """Add content to the document, or write it straight to the file in append mode"""
+        if self._stream is not None:
+            self._stream.write(str(content))            # Render and stream the content
+        elif self._stream_path is not None:
+            raise ValueError(f'Document {self._filename} was finished in append mode, no more content can be added')
+        else:
+            if isinstance(content, AbstractProduct):
+                self._positions.setdefault(content, []).append(len(self._content))
+                content._AddOwner(self)                 # Have the product invalidate this document's rendering when changed
+            self._content.append(content)               # Add content to private content array
+
+    def _Render(self):
+        """Render the document's contents, only rendering products added or changed since the last render
+
+        Returns:
+            list: Rendering of each product, to be written out in turn rather than joined
+        """
+        for index in self._stale:                       # Re-render only the changed products
+            self._rendered[index] = str(self._content[index])
+        self._stale.clear()
+        if len(self._rendered) < len(self._content):
+            self._rendered.extend(str(x) for x in self._content[len(self._rendered):])
+        return self._rendered
+
+    def _Invalidate(self, product):
+        """Mark the cached renderings of a changed product as stale
+
+        Args:
+            product (AbstractProduct): Product in the document that has changed.
+        """
+        rendered = len(self._rendered)
+        self._stale.update(index for index in self._positions.get(product, ()) if index < rendered)
+
+    def _Write(self, filepath):
+        """Write the document to a file, streaming each product's rendering through a buffered file handle"""
+        if self._stream_path is not None:               # Append mode, the file is already written
+            self.Close()
+            if os.path.abspath(self._stream_path) == os.path.abspath(filepath):
+                return
+            if self._stream_saved:                      # Saved before, keep that copy
+                shutil.copyfile(self._stream_path, filepath)
+            else:                                       # First save, move the working file into place
+                shutil.move(self._stream_path, filepath)
+                self._stream_path = filepath
+                self._stream_saved = True
+            return
+        with open(filepath, "w", encoding="utf-8", buffering=_CHUNK_SIZE) as file:
+            file.write(self._Header())
+            file.writelines(self._Render())             # One product at a time, never the whole document at once
+            file.write("\n")
+
+    def _Display(self):
+        """Display entire document, reading it back from the file in append mode"""
+        if self._stream_path is None:
+            sys.stdout.write("\n" + self._Header())
+            sys.stdout.writelines(self._Render())       # Display entire document (using cached rendering of products) and metadata
+            sys.stdout.write("\n\n")
+            return
+        if self._stream is not None:
+            self._stream.flush()
+        sys.stdout.write("\n")
+        with open(self._stream_path, encoding="utf-8") as file:
+            while chunk := file.read(_CHUNK_SIZE):      # Display the file a chunk at a time
+                sys.stdout.write(chunk)
+        sys.stdout.write("\n" if self._stream is None else "\n\n")    # A finished file already ends with its newline
 
     def Save(self, filepath):
         """Save document to given file path.
@@ -29,8 +217,42 @@ class AbstractDocument():
         """Return entire contents of document"""
         pass
 
-class AbstractImage():
+class AbstractProduct():
+    """Abstract Product Interface caching each product's rendering until it changes"""
+    __slots__ = ("_rendered", "_owners")
+
+    def __init__(self):
+        """Initialise empty rendering cache and owners."""
+        self._rendered = None   # Cached rendering, None until rendered or after a change
+        self._owners = None     # Documents containing the product, None until added to one
+
+    def __str__(self):
+        """Return the cached rendering, rendering the product if it has changed"""
+        if self._rendered is None:
+            self._rendered = self._Render()
+        return self._rendered
+
+    def _Render(self):
+        """Render the product, to be overridden by child classes"""
+        return ""
+
+    def _AddOwner(self, document):
+        """Record a document containing the product"""
+        if self._owners is None:
+            self._owners = set()
+        self._owners.add(document)
+
+    def _Changed(self):
+        """Drop the cached rendering of the product and its renderings in every document containing it"""
+        self._rendered = None
+        if self._owners is not None:
+            for document in self._owners:
+                document._Invalidate(self)
+
+class AbstractImage(AbstractProduct):
     """Abstract Image Interface"""
+    __slots__ = ("_data",)
+
     def __init__(self, path, width, height):
         """Initialise image file path, width, and height.
 
@@ -39,9 +261,13 @@ class AbstractImage():
             width (int): Desired image width in pixels.
             height (int): Desired image height in pixels.
         """
-        self._path = path       # Initialise image path
-        self._width = width     # Initialise image width
-        self._height = height   # Initialise image height
+        super().__init__()                                                  # Initialise rendering cache
+        self._data = _flyweights.Intern(ImageData(path, width, height))    # Initialise shared image path, width and height
+
+    def _Resized(self, width, height):
+        """Point this image at data with the new size, leaving the shared data other images use untouched (copy on write)"""
+        self._data = _flyweights.Intern(self._data._replace(width=width, height=height))
+        self._Changed()
 
     def Resize(self, width, height):
         """Resize image
@@ -52,15 +278,18 @@ class AbstractImage():
         """
         pass
 
-class AbstractText():
+class AbstractText(AbstractProduct):
     """Abstract Text Interface"""
+    __slots__ = ("_text",)
+
     def __init__(self, text):
         """Initialise text.
 
         Args:
             text (string): Initial text.
         """
-        self._text = text
+        super().__init__()                      # Initialise rendering cache
+        self._text = _flyweights.Intern(text)   # Initialise shared text
 
     def Modify(self, text):
         """Modify product text.
@@ -70,6 +299,8 @@ class AbstractText():
         """
         pass
 
+_create_probes = {method: instrumentation.GetProbe(f'DocumentFactory.{method}') for method in ("CreateDocument", "CreateText", "CreateImage")}    # Count and time product creation by factory
+
 class DocumentFactory():
     """Document Factory Interface"""
     def CreateDocument(self, filename):
@@ -84,97 +315,132 @@ class DocumentFactory():
 
 class PDFDocument(AbstractDocument):
     """Concrete Document Factory for PDF Documents"""
+    __slots__ = ()
+
     def Save(self, filepath):
         """PDF-specific implementation of Save method"""
-        print(f'Saved PDF Document to {filepath}') # Print feedback to the console
+        self._Write(filepath) # Write document to file
+        events.Emit("Save", 'Saved PDF Document to {filepath}', filepath=filepath) # Emit feedback event
     
     def AddContent(self, content):
         """PDF-specific implementation of AddContent method"""
-        self._content.append(content) # Add content to private content array
-        print("Added content to PDF Document: {}".format(str(content))) # Print feedback to the console
+        self._Add(content) # Add content to document
+        events.Emit("AddContent", "Added content to PDF Document: {content}", content=content) # Emit feedback event
 
     def View(self):
         """PDF-specific implementation of View method"""
-        print(f'\nFiletype: PDF \nFilename: {self._filename} \nContents: \n' + "".join(str(x) for x in self._content) + "\n") # Display entire document (using __str__ method of products) and metadata
+        self._Display() # Display entire document and metadata
+
+    def _Header(self):
+        """PDF-specific document metadata"""
+        return 'Filetype: PDF \n' + super()._Header()
 
 class WordDocument(AbstractDocument):
     """Concrete Document Factory for Word Documents"""
+    __slots__ = ()
+
     def Save(self, filepath):
         """Word-specific implementation of Save method"""
-        print(f'Saved Word Document to {filepath}') # Print feedback to the console
+        self._Write(filepath) # Write document to file
+        events.Emit("Save", 'Saved Word Document to {filepath}', filepath=filepath) # Emit feedback event
     
     def AddContent(self, content):
         """Word-specific implementation of AddContent method"""
-        self._content.append(content) # Add content to private content array
-        print("Added content to Word Document: {}".format(str(content))) # Print feedback to the console
+        self._Add(content) # Add content to document
+        events.Emit("AddContent", "Added content to Word Document: {content}", content=content) # Emit feedback event
 
     def View(self):
         """Word-specific implementation of View method"""
-        print(f'\nFiletype: Word \nFilename: {self._filename} \nContents: \n' + "".join(str(x) for x in self._content) + "\n") # Display entire document (using __str__ method of products) and metadata
+        self._Display() # Display entire document and metadata
+
+    def _Header(self):
+        """Word-specific document metadata"""
+        return 'Filetype: Word \n' + super()._Header()
 
 class PDFImage(AbstractImage):
     """PDF Image Product"""
+    __slots__ = ()
+
     def Resize(self, width, height):
         """PDF-specific implementation of Resize method"""
-        self._width = width
-        self._height = height
-        print(f'Resized PDF Image at path: {self._path}') # Print feedback to the console
-    def __str__(self):
-        return f'[PDF Image, {self._width}x{self._height}, @ {self._path}]' # Crude method to avoid the need for a 'render' function for each product
+        self._Resized(width, height)
+        events.Emit("Resize", 'Resized PDF Image at path: {path}', path=self._data.path) # Emit feedback event
+    def _Render(self):
+        return f'[PDF Image, {self._data.width}x{self._data.height}, @ {self._data.path}]' # Render product, cached by AbstractProduct.__str__
 
 class WordImage(AbstractImage):
     """Word Image Product"""
+    __slots__ = ()
+
     def Resize(self, width, height):
         """Word-specific implementation of Resize method"""
-        self._width = width
-        self._height = height
-        print(f'Resized Word Image at path: {self._path}') # Print feedback to the console
-    def __str__(self):
-        return f'[Word Image, {self._width}x{self._height}, @ {self._path}]' # Crude method to avoid the need for a 'render' function for each product
+        self._Resized(width, height)
+        events.Emit("Resize", 'Resized Word Image at path: {path}', path=self._data.path) # Emit feedback event
+    def _Render(self):
+        return f'[Word Image, {self._data.width}x{self._data.height}, @ {self._data.path}]' # Render product, cached by AbstractProduct.__str__
 
 class PDFText(AbstractText):
     """PDF Text Product"""
+    __slots__ = ()
+
     def Modify(self, text):
         """PDF-specific implementation of Modify method"""
-        self._text = text # Modify text content
-        print("Modified PDF Text") # Print feedback to the console
-    def __str__(self):
-        return f'[PDF Text] {self._text}' # Crude method to avoid the need for a 'render' function for each product
+        self._text = _flyweights.Intern(text) # Modify text content, sharing it with equal text
+        self._Changed() # Invalidate cached renderings
+        events.Emit("Modify", "Modified PDF Text") # Emit feedback event
+    def _Render(self):
+        return f'[PDF Text] {self._text}' # Render product, cached by AbstractProduct.__str__
 
 class WordText(AbstractText):
     """Word Text Product"""
+    __slots__ = ()
+
     def Modify(self, text):
         """Word-specific implementation of Modify method"""
-        self._text = text # Modify text content
-        print("Modified Word Text") # Print feedback to the console
-    def __str__(self):
-        return f'[Word Text] {self._text}' # Crude method to avoid the need for a 'render' function for each product
+        self._text = _flyweights.Intern(text) # Modify text content, sharing it with equal text
+        self._Changed() # Invalidate cached renderings
+        events.Emit("Modify", "Modified Word Text") # Emit feedback event
+    def _Render(self):
+        return f'[Word Text] {self._text}' # Render product, cached by AbstractProduct.__str__
 
 class PDFFactory(DocumentFactory):
     """Concrete PDF Product Factory inheriting from Document Factory Interface"""
     def CreateDocument(self, filename):
+        if instrumentation.enabled:
+            return _create_probes["CreateDocument"].Call("PDFFactory", PDFDocument, filename)
         return PDFDocument(filename) # Create and return PDF Document product
     
     def CreateText(self, text):
+        if instrumentation.enabled:
+            return _create_probes["CreateText"].Call("PDFFactory", PDFText, text)
         return PDFText(text) # Create and return PDF Text product
 
     def CreateImage(self, path, width, height):
+        if instrumentation.enabled:
+            return _create_probes["CreateImage"].Call("PDFFactory", PDFImage, path, width, height)
         return PDFImage(path, width, height) # Create and return PDF Image product
 
 class WordFactory(DocumentFactory):
     """Concrete Word Product Factory inheriting from Document Factory Interface"""
     def CreateDocument(self, filename):
+        if instrumentation.enabled:
+            return _create_probes["CreateDocument"].Call("WordFactory", WordDocument, filename)
         return WordDocument(filename) # Create and return Word Document product
     
     def CreateText(self, text):
+        if instrumentation.enabled:
+            return _create_probes["CreateText"].Call("WordFactory", WordText, text)
         return WordText(text) # Create and return Word Text product
 
     def CreateImage(self, path, width, height):
+        if instrumentation.enabled:
+            return _create_probes["CreateImage"].Call("WordFactory", WordImage, path, width, height)
         return WordImage(path, width, height) # Create and return Word Image product
 
 class Client():
-    def __init__(self, document_factory):
-        self._factory = document_factory # Initialise private factory
+    def __init__(self, document_factory, save_directory="."):
+        self._factory = document_factory        # Initialise private factory
+        self._save_directory = save_directory   # Initialise directory reports are saved in
 
     def Report(self):
         document = self._factory.CreateDocument('Test File')                    # Create document of the type of the factory passed in to the client
@@ -185,10 +451,115 @@ class Client():
         document.AddContent(text)                                               # Add text product to the document content
         text.Modify("Look at the image! (edited)")                              # Modify the text product
         document.View()                                                         # View created document
-        document.Save("save/file/path")                                         # Save created document
+        document.Save(os.path.join(self._save_directory, f'Test File {type(self._factory).__name__}.txt'))  # Save created document
+
+class ReportEngine():
+    """Bulk report generation engine.
+
+    Each report is built, rendered and written to its file inside a process pool, so the CPU-bound rendering
+    runs on every core and only the report's file path comes back to this process. Specifications are consumed
+    lazily and the number of reports in flight is bounded. Each specification is a dict with "format" (a key of
+    the factories), "filename", "filepath", and "content", a list of ("text", text) and ("image", path, width, height) blocks.
+    """
+    def __init__(self, factories=None, processes=None, max_in_flight=None):
+        """Initialise engine
+
+        Args:
+            factories (dict): Format name -> DocumentFactory class, defaults to "pdf" and "word".
+            processes (int): Number of report generating processes, defaults to the number of cores.
+            max_in_flight (int): Maximum reports being generated at once, defaults to four per process.
+        """
+        self._factories = factories or {"pdf": PDFFactory, "word": WordFactory}
+        self._processes = processes or os.cpu_count() or 1
+        self._max_in_flight = max_in_flight or 4 * self._processes
+        self._submitted = 0         # Reports sent to be generated
+        self._saved = 0             # Reports written to their files
+        self._start = None          # Time the current run started
+
+    def Run(self, specifications):
+        """Generate and save every report
+
+        Args:
+            specifications (iterable): Report specifications
+
+        Returns:
+            int: Number of reports saved
+
+        Raises:
+            ValueError: If a specification's format has no factory
+        """
+        self._submitted = self._saved = 0
+        self._start = time.perf_counter()
+        with ProcessPoolExecutor(self._processes, initializer=_InitReportWorker) as generators:
+            pending = set()
+            for specification in specifications:
+                if specification["format"] not in self._factories:
+                    raise ValueError(f'No factory for format {specification["format"]}')
+                if len(pending) >= self._max_in_flight:                         # Bound the reports in flight
+                    self._Advance(pending)
+                pending.add(generators.submit(_GenerateReport, specification, self._factories))
+                self._submitted += 1
+            while pending:                                                      # Finish the remaining reports
+                self._Advance(pending)
+        return self._saved
+
+    def GetProgress(self):
+        """Get progress of the current or last run
+
+        Returns:
+            dict: Reports submitted and saved, seconds elapsed, and reports saved per second
+        """
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0
+        return {"submitted": self._submitted, "saved": self._saved,
+                "elapsed": elapsed, "throughput": self._saved / elapsed if elapsed else 0}
+
+    def _Advance(self, pending):
+        """Wait for at least one report to be saved"""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            future.result()                                                     # Raise any error generating the report
+            self._saved += 1
+
+def _InitReportWorker():
+    """Silence feedback events in report generating processes"""
+    events.SetSink(events.NullSink())
+
+def _GenerateReport(specification, factories):
+    """Build, render and save a report's document, in a report generating process
+
+    Returns:
+        path: File the report was saved to
+    """
+    factory = factories[specification["format"]]()                  # Factory of the report's family
+    document = factory.CreateDocument(specification["filename"])
+    for block in specification["content"]:
+        if block[0] == "text":
+            document.AddContent(factory.CreateText(block[1]))
+        else:
+            document.AddContent(factory.CreateImage(*block[1:]))
+    document.Save(specification["filepath"])                        # Rendered and written here, not in the parent
+    return specification["filepath"]
 
 if __name__ == "__main__":
-    word_client = Client(WordFactory()) # Create client with the word document factory
-    pdf_client = Client(PDFFactory())   # Create client with the PDF document factory
+    import tempfile
+    save_directory = tempfile.mkdtemp()                 # Save reports somewhere temporary
+    word_client = Client(WordFactory(), save_directory) # Create client with the word document factory
+    pdf_client = Client(PDFFactory(), save_directory)   # Create client with the PDF document factory
     word_client.Report()                # Issue report for word client
-    pdf_client.Report()                 # Issue report for PDF client
\ No newline at end of file
+    pdf_client.Report()                 # Issue report for PDF client
+
+    factory = PDFFactory()
+    streamed_document = factory.CreateDocument('Streamed File')                 # Create a document in append mode,
+    streamed_document.OpenStream(os.path.join(save_directory, 'Streamed File.txt'))
+    for index in range(3):
+        streamed_document.AddContent(factory.CreateText(f'Block {index}. '))    # each block written out as it is added
+    streamed_document.View()
+    streamed_document.Save(os.path.join(save_directory, 'Streamed File.txt'))
+
+    events.SetSink(events.NullSink())                                          # Quiet bulk generation
+    engine = ReportEngine(processes=2)
+    engine.Run({"format": ("pdf", "word")[index % 2], "filename": f'Report {index}', "filepath": os.path.join(save_directory, f'Report {index}.txt'),
+                "content": [("image", "path/to/logo/", 100, 50), ("text", f'Report number {index}')]} for index in range(100))
+    print(f'Bulk report progress: {engine.GetProgress()}')
+    shutil.rmtree(save_directory)
\ No newline at end of file
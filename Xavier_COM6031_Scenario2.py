@@ -1,8 +1,41 @@
+import asyncio
+import inspect
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from bisect import bisect_left, bisect_right
+
+import Xavier_COM6031_Events as events
+import Xavier_COM6031_Instrumentation as instrumentation
+
+_notify_probe = instrumentation.GetProbe("GenericPublisherInterface.Notify")  # Counts and times notifications by publisher type
+
+_NOTHING = object() # Sentinel for a publisher that has not notified yet
+
 class GenericPublisherInterface():
     """Generic Publisher Interface responsible for managing and notifying subscribers
     """
-    def __init__(self):
-        self._subscribers = [] # Initialise empty subscribers array
+    def __init__(self, weak=False):
+        """Initialise empty subscriber registry
+
+        Args:
+            weak (bool): Hold subscribers by weak reference, so garbage collected subscribers are dropped automatically.
+        """
+        self._weak = weak                   # Whether subscribers are held by weak reference
+        self._subscribers = {}              # Initialise empty insertion-ordered subscribers registry, id -> subscriber (or weak reference)
+        self._thresholds = []               # Sorted thresholds of threshold subscribers
+        self._threshold_subscribers = []    # Threshold subscribers (or weak references), in the same order as their thresholds
+        self._last_data = _NOTHING          # Last data subscribers were notified of
+        self._batch_count = None            # Deliver a batch once this many updates are pending (None to disable)
+        self._batch_delay = None            # Deliver a batch this many seconds after its first update (None to disable)
+        self._batch_keep_all = False        # Deliver every pending value rather than only the last
+        self._pending = []                  # Updates waiting to be delivered
+        self._batch_timer = None            # Timer delivering the pending batch after the delay
+        self._batch_lock = threading.RLock()
+        self._executor = None               # Executor dispatching Update calls concurrently (None to notify in turn)
+        self._timeout = None                # Seconds each subscriber is given when notifying concurrently
+        self._last_report = None            # Per-subscriber report of the last concurrent notification
 
     def AddSub(self, subscriber):
         """Add subscriber to list of subscribers
@@ -10,8 +43,20 @@ class GenericPublisherInterface():
         Args:
             subscriber (GenericSubscriberInterface): Subscriber to be added to list of subscribers.
         """
-        self._subscribers.append(subscriber)        # Append subscriber to subscribers array
-        print(f'Added Subscriber: {subscriber}')    # Print feedback to the console
+        self._Register(subscriber)                  # Add subscriber to subscribers registry
+        events.Emit("AddSub", 'Added Subscriber: {subscriber}', subscriber=subscriber)    # Emit feedback event
+
+    def AddSubs(self, subscribers):
+        """Add several subscribers to list of subscribers, in order
+
+        Args:
+            subscribers (iterable): Subscribers to be added to list of subscribers.
+        """
+        count = 0
+        for subscriber in subscribers:
+            self._Register(subscriber)              # Add subscriber to subscribers registry
+            count += 1
+        events.Emit("AddSubs", 'Added {count} Subscribers', count=count)                   # Emit feedback event once
 
     def RemoveSub(self, subscriber):
         """Remove subscriber from list of subscribers
@@ -19,17 +64,308 @@ class GenericPublisherInterface():
         Args:
             subscriber (GenericSubscriberInterface): Subscriber to be removed from list of subscribers
         """
-        self._subscribers.remove(subscriber)        # Remove subscriber from subscribers array
-        print(f'Removed Subscriber: {subscriber}')  # Print feedback to console
+        self._Unregister(subscriber)                # Remove subscriber from subscribers registry
+        events.Emit("RemoveSub", 'Removed Subscriber: {subscriber}', subscriber=subscriber) # Emit feedback event
+
+    def RemoveSubs(self, subscribers):
+        """Remove several subscribers from list of subscribers
+
+        Args:
+            subscribers (iterable): Subscribers to be removed from list of subscribers.
+        """
+        count = 0
+        for subscriber in subscribers:
+            self._Unregister(subscriber)            # Remove subscriber from subscribers registry
+            count += 1
+        events.Emit("RemoveSubs", 'Removed {count} Subscribers', count=count)              # Emit feedback event once
+
+    def _Register(self, subscriber):
+        """Add subscriber to the registry, or the threshold index for threshold subscribers. A subscriber is only registered once.
+
+        Args:
+            subscriber (GenericSubscriberInterface): Subscriber to be added.
+        """
+        if isinstance(subscriber, ThresholdSubscriberInterface):                    # Threshold subscribers are indexed by threshold,
+            threshold = subscriber.GetThreshold()
+            start = bisect_left(self._thresholds, threshold)                        # Only subscribers with an equal threshold can be the same,
+            end = bisect_right(self._thresholds, threshold)
+            if any(_Dereference(self._threshold_subscribers[index], self._weak) is subscriber for index in range(start, end)):
+                return                                                              # so it is already subscribed if it is among them.
+            entry = subscriber
+            if self._weak:                                                          # dropped from the index once collected,
+                thresholds, entries = self._thresholds, self._threshold_subscribers
+                entry = weakref.ref(subscriber, lambda ref: _RemoveIndexed(thresholds, entries, threshold, ref))
+            self._thresholds.insert(end, threshold)                                 # and placed after any with an equal threshold.
+            self._threshold_subscribers.insert(end, entry)
+            return
+
+        key = id(subscriber)
+        if key in self._subscribers:                # Already subscribed
+            return
+        if self._weak:                              # Drop the subscriber from the registry once collected
+            subscribers = self._subscribers
+            self._subscribers[key] = weakref.ref(subscriber, lambda ref: subscribers.pop(key, None) if subscribers.get(key) is ref else None)
+        else:
+            self._subscribers[key] = subscriber
+
+    def _Unregister(self, subscriber):
+        """Remove subscriber from the registry, or the threshold index for threshold subscribers
+
+        Args:
+            subscriber (GenericSubscriberInterface): Subscriber to be removed.
+
+        Raises:
+            ValueError: If the subscriber is not subscribed
+        """
+        if isinstance(subscriber, ThresholdSubscriberInterface):
+            start = bisect_left(self._thresholds, subscriber.GetThreshold())        # Search only the subscribers with the same threshold
+            end = bisect_right(self._thresholds, subscriber.GetThreshold())
+            for index in range(start, end):
+                if _Dereference(self._threshold_subscribers[index], self._weak) is subscriber:
+                    del self._thresholds[index]
+                    del self._threshold_subscribers[index]
+                    return
+        elif self._subscribers.pop(id(subscriber), None) is not None:
+            return
+        raise ValueError(f'{subscriber} is not subscribed')
+
+    def SetBatching(self, count=None, delay=None, keep_all=False):
+        """Coalesce notifications into batches, delivered when either window closes. Pending updates are delivered before the change.
+
+        Args:
+            count (int): Deliver once this many updates are pending, None for no count window.
+            delay (float): Deliver this many seconds after the first pending update, None for no time window.
+            keep_all (bool): Deliver every pending value, rather than only the latest.
+        """
+        self.Flush()                        # Deliver anything pending under the old settings
+        self._batch_count = count
+        self._batch_delay = delay
+        self._batch_keep_all = keep_all
+
+    def SetExecutor(self, executor, timeout=None):
+        """Dispatch Update calls concurrently through an executor, isolating slow or failing subscribers
+
+        Args:
+            executor (concurrent.futures.Executor): Thread based executor to dispatch Update calls, e.g. a ThreadPoolExecutor. None to notify subscribers in turn.
+            timeout (float): Seconds each subscriber is given from when its call starts, None to wait for every subscriber.
+        """
+        self._executor = executor
+        self._timeout = timeout
+
+    def GetNotifyReport(self):
+        """Get the report of the last concurrent notification
+
+        Returns:
+            list: (subscriber, latency in seconds, exception) for each subscriber notified. Latency is None and the exception a TimeoutError for subscribers that timed out.
+        """
+        return self._last_report
 
     def Notify(self, data):
-        """Notify subscribers of data change
+        """Notify subscribers of data change, or queue the change if batching
 
         Args:
             data (object): New data to update subscribers with.
+
+        Returns:
+            list: Per-subscriber report if notified concurrently, see GetNotifyReport
         """
-        for subscriber in self._subscribers:   # Loop over every current subscribed entity
-            subscriber.Update(data)            # Call subscriber's Update function with new data
+        if instrumentation.enabled:
+            return _notify_probe.Call(type(self).__name__, self._Notify, data)
+        return self._Notify(data)
+
+    def _Notify(self, data):
+        """Private notification of subscribers, or queueing of the change if batching"""
+        if self._batch_count is None and self._batch_delay is None:    # Not batching, deliver immediately
+            return self._Deliver([data], False)
+
+        with self._batch_lock:
+            self._pending.append(data)                                              # Queue the update,
+            if self._batch_count is not None and len(self._pending) >= self._batch_count:
+                self.Flush()                                                        # deliver if the count window is full,
+            elif self._batch_delay is not None and self._batch_timer is None:
+                self._batch_timer = threading.Timer(self._batch_delay, self.Flush)  # or start the time window.
+                self._batch_timer.daemon = True
+                self._batch_timer.start()
+
+    def Flush(self):
+        """Deliver pending updates now
+        """
+        with self._batch_lock:
+            if self._batch_timer is not None:               # Close the time window
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            if not self._pending:
+                return
+            values = self._pending if self._batch_keep_all else self._pending[-1:]
+            self._pending = []
+            self._Deliver(values, True)
+
+    def _Deliver(self, values, batched):
+        """Deliver updates to subscribers
+
+        Args:
+            values (list): Updates to deliver, oldest first.
+            batched (bool): Deliver through each subscriber's UpdateBatch, rather than Update.
+
+        Returns:
+            list: Per-subscriber report if notified concurrently, see GetNotifyReport
+        """
+        subscribers = self._Targets(values)
+        if self._executor is not None:
+            return self._DeliverConcurrently(subscribers, values, batched)
+        for subscriber in subscribers:          # Loop over every subscriber to be notified
+            if batched:
+                subscriber.UpdateBatch(values)  # Call subscriber's UpdateBatch function with the batch of updates
+            else:
+                subscriber.Update(values[-1])   # Call subscriber's Update function with new data
+
+    def _DeliverConcurrently(self, subscribers, values, batched):
+        """Deliver updates to subscribers through the executor.
+
+        Each subscriber's timeout runs from when its own call starts, so calls queued behind slow subscribers
+        are not charged for the wait. Calls are never cancelled, a subscriber reported as timed out still
+        receives the update once its call runs.
+
+        Args:
+            subscribers (list): Subscribers to be notified.
+            values (list): Updates to deliver, oldest first.
+            batched (bool): Deliver through each subscriber's UpdateBatch, rather than Update.
+
+        Returns:
+            list: Per-subscriber report, see GetNotifyReport
+        """
+        started = [None] * len(subscribers)             # Start time of each call, set by the call itself
+        futures = {self._executor.submit(_TimedCall, subscriber.UpdateBatch if batched else subscriber.Update,
+                                         values if batched else values[-1], started, index): index
+                   for index, subscriber in enumerate(subscribers)}     # Dispatch every Update call at once,
+        report = [None] * len(subscribers)
+        pending = set(futures)
+        overrun = set()                                 # Calls still running past their timeout
+        while pending:                                  # and wait until each completes or runs out of time.
+            done, _ = wait(pending, self._NextTimeout(pending, futures, started), FIRST_COMPLETED)
+            for future in done:
+                report[futures[future]] = (subscribers[futures[future]], *future.result())
+            pending -= done
+            overrun -= done
+            if self._timeout is None:
+                continue
+            now = time.perf_counter()
+            for future in list(pending):
+                start = started[futures[future]]
+                if start is not None and now - start >= self._timeout:             # Timed out since its own start
+                    report[futures[future]] = (subscribers[futures[future]], None, TimeoutError(f'Update did not complete within {self._timeout}s'))
+                    pending.discard(future)
+                    overrun.add(future)
+            if not done and overrun and all(started[futures[future]] is None for future in pending):
+                for future in pending:                  # Every worker is held by an overrunning call, stop waiting for the queue
+                    report[futures[future]] = (subscribers[futures[future]], None, TimeoutError('Update is queued behind subscribers that timed out'))
+                break
+        self._last_report = report
+        return report
+
+    def _NextTimeout(self, pending, futures, started):
+        """Seconds until the earliest running call among pending calls times out, None if there is no timeout"""
+        if self._timeout is None:
+            return None
+        now = time.perf_counter()
+        deadlines = [started[futures[future]] + self._timeout - now for future in pending if started[futures[future]] is not None]
+        return max(0, min(deadlines)) if deadlines else self._timeout    # Calls not yet started are given a full timeout to start
+
+    async def NotifyAsync(self, data, timeout=None):
+        """Notify subscribers of data change concurrently on the running event loop.
+
+        Coroutine Update functions are awaited, others are run in a thread so they do not block the loop.
+
+        Args:
+            data (object): New data to update subscribers with.
+            timeout (float): Seconds each subscriber is given to complete, None to wait for every subscriber.
+
+        Returns:
+            list: Per-subscriber report, see GetNotifyReport
+        """
+        subscribers = self._Targets([data])
+        results = await asyncio.gather(*(_TimedCallAsync(subscriber.Update, data, timeout) for subscriber in subscribers))
+        report = [(subscriber, *result) for subscriber, result in zip(subscribers, results)]
+        self._last_report = report
+        return report
+
+    def _Targets(self, values):
+        """Find the subscribers to be notified of new data
+
+        Args:
+            values (list): Updates to deliver, oldest first. A threshold crossed by any of them, even if a later one crosses back, counts as changed.
+
+        Returns:
+            list: Every plain subscriber, followed by the threshold subscribers whose side of their threshold changed.
+        """
+        data = values[-1]
+        if not self._thresholds:                                    # Only threshold subscribers need the data to be ordered,
+            self._last_data = _NOTHING                              # so plain subscribers accept any data.
+            start = end = 0
+        elif self._last_data is _NOTHING:                           # On the first notification every threshold subscriber is updated,
+            start, end = 0, len(self._thresholds)
+            self._last_data = data
+        else:                                                       # afterwards only those whose side of the threshold changed,
+            low, high = min(self._last_data, *values), max(self._last_data, *values)    # i.e. low <= threshold < high.
+            start = bisect_left(self._thresholds, low)
+            end = bisect_left(self._thresholds, high)
+            self._last_data = data
+        subscribers = list(self._subscribers.values()) + self._threshold_subscribers[start:end]
+        if self._weak:                                              # Dereference, skipping any collected but not yet dropped
+            subscribers = [subscriber for subscriber in (ref() for ref in subscribers) if subscriber is not None]
+        return subscribers
+
+def _Dereference(entry, weak):
+    """Get the subscriber held by a registry entry
+
+    Returns:
+        GenericSubscriberInterface: Subscriber, or None if it has been collected
+    """
+    return entry() if weak else entry
+
+def _RemoveIndexed(thresholds, entries, threshold, entry):
+    """Remove a collected subscriber's weak reference from a threshold index"""
+    start = bisect_left(thresholds, threshold)
+    end = bisect_right(thresholds, threshold)
+    for index in range(start, end):
+        if entries[index] is entry:
+            del thresholds[index]
+            del entries[index]
+            return
+
+def _TimedCall(update, data, started, index):
+    """Call a subscriber's update function, timing it and capturing any exception
+
+    Args:
+        started (list): Start times of every call, this call's start is recorded at index
+
+    Returns:
+        tuple: (latency in seconds, exception or None)
+    """
+    start = started[index] = time.perf_counter()
+    try:
+        update(data)
+    except Exception as error:
+        return time.perf_counter() - start, error
+    return time.perf_counter() - start, None
+
+async def _TimedCallAsync(update, data, timeout):
+    """Await a subscriber's update function, or run it in a thread, timing it and capturing any exception
+
+    Returns:
+        tuple: (latency in seconds, exception or None), latency is None if the update timed out
+    """
+    start = time.perf_counter()
+    try:
+        if inspect.iscoroutinefunction(update):
+            await asyncio.wait_for(update(data), timeout)
+        else:
+            await asyncio.wait_for(asyncio.to_thread(update, data), timeout)
+    except asyncio.TimeoutError:
+        return None, TimeoutError(f'Update did not complete within {timeout}s')
+    except Exception as error:
+        return time.perf_counter() - start, error
+    return time.perf_counter() - start, None
 
 class GenericSubscriberInterface():
     """Generic Subscriber Interface for overriding
@@ -42,11 +378,41 @@ class GenericSubscriberInterface():
         """
         pass
 
+    def UpdateBatch(self, values):
+        """Batched Update function, to be overriden by subscribers that can handle several updates at once
+
+        Args:
+            values (list): New data passed from event provider to this object, oldest first
+        """
+        for data in values:     # By default, handle each update in turn
+            self.Update(data)
+
+class ThresholdSubscriberInterface(GenericSubscriberInterface):
+    """Subscriber whose response only depends on whether new data is above a threshold.
+
+    Publishers index these subscribers by threshold and only update them when the data crosses it.
+    """
+    def __init__(self, threshold):
+        """Initialise threshold
+
+        Args:
+            threshold (float): Data above this threshold gives a different response to data at or below it
+        """
+        self._threshold = threshold     # Initialise threshold
+
+    def GetThreshold(self):
+        """Get threshold
+
+        Returns:
+            float: Threshold of this subscriber
+        """
+        return self._threshold          # Return threshold
+
 class InsuranceCompany(GenericPublisherInterface):
     """Concrete implementation of publisher. Insurance company responsible for controlling insurance premiums and notifying customers/subscribers
     """
-    def __init__(self, premium):
-        super().__init__()          # Initialise subscribers array from parent class
+    def __init__(self, premium, weak=False):
+        super().__init__(weak)      # Initialise subscribers registry from parent class
         self._premium = premium     # Initialise insurance premium
 
     def GetPremium(self):
@@ -63,7 +429,7 @@ class InsuranceCompany(GenericPublisherInterface):
         Args:
             new_premium (float): New insurance premium
         """
-        print(f'\nSetting Insurance Premium to: {new_premium}')     # Print feedback to console
+        events.Emit("SetPremium", '\nSetting Insurance Premium to: {premium}', premium=new_premium)    # Emit feedback event
         self._premium = new_premium                                 # Set new insurance premium
         self.Notify(self._premium)                                  # Notify customers/subscribers
 
@@ -109,6 +475,20 @@ class Customer3(GenericSubscriberInterface):
         else:
             print("Customer 3: This is an acceptable new insurance premium")
 
+class ThresholdCustomer(ThresholdSubscriberInterface):
+    """Concrete implementation of threshold subscriber. Customer who only responds when the insurance premium crosses their limit.
+    """
+    def Update(self, new_premium):
+        """Response to an insurance premium crossing this customer's limit
+
+        Args:
+            new_premium (float): New insurance premium received
+        """
+        if(new_premium > self._threshold):
+            print(f"Customer with limit {self._threshold}: This new insurance premium is unacceptable")
+        else:
+            print(f"Customer with limit {self._threshold}: This is an acceptable new insurance premium")
+
 if __name__ == "__main__":
     evil_insurance = InsuranceCompany(80)                           # Create insurance company 'evil_insurance' with initial insurance premium of 80
     c1 = Customer1()                                                # Create instance of Customer1 ('c1')
@@ -124,3 +504,23 @@ if __name__ == "__main__":
     evil_insurance.SetPremium(210)                                  # ... more unique responses to changing premium
     evil_insurance.RemoveSub(c2)                                    # Remove 'c2' from 'evil_insurance' subscriber list
     evil_insurance.SetPremium(140)                                  # Set new premium, expecting one less response than previous responses given 'c2' is no longer subscribed
+
+    fair_insurance = InsuranceCompany(80)                           # Create insurance company 'fair_insurance' with threshold subscribers
+    fair_insurance.AddSubs(ThresholdCustomer(limit) for limit in (100, 150, 200))  # Add customers indexed by their premium limit
+    fair_insurance.SetPremium(90)                                   # First premium, every customer responds
+    fair_insurance.SetPremium(95)                                   # No customer's limit is crossed, no responses
+    fair_insurance.SetPremium(160)                                  # Only the customers with limits 100 and 150 respond
+    fair_insurance.SetPremium(140)                                  # Only the customer with limit 150 responds
+
+    fair_insurance.SetBatching(count=5)                             # Coalesce premium revisions into batches of 5
+    for revision in (150, 170, 190, 210):
+        fair_insurance.SetPremium(revision)                         # Pending, no responses yet
+    fair_insurance.Flush()                                          # Deliver only the latest premium, 210
+    fair_insurance.SetBatching()                                    # Stop batching
+
+    with ThreadPoolExecutor() as executor:
+        fair_insurance.SetExecutor(executor, timeout=1)             # Notify customers concurrently, giving each at most a second
+        fair_insurance.SetPremium(120)
+        for customer, latency, error in fair_insurance.GetNotifyReport():
+            print(f'Notified {customer} in {latency}s, error: {error}')
+        fair_insurance.SetExecutor(None)
@@ -1,6 +1,60 @@
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import Xavier_COM6031_Events as events
+import Xavier_COM6031_Instrumentation as instrumentation
+
+_size_probe = instrumentation.GetProbe("Folder.CalculateSize")     # Counts and times folder size queries
+
 class Component():
     """Base Component Interface which defines CalculateSize method
     """
+    __slots__ = ()              # Allow slotted children, such as compact tree handles, to avoid a __dict__
+
+    def __init__(self):
+        """Initialise component with empty parents array
+        """
+        self._parents = []      # Folders containing this component, so cached sizes can be updated up the tree
+
+    def _PropagateSize(self, delta):
+        """Add a change in this component's size to the cached size of every folder above it
+
+        Args:
+            delta (float): Change in size
+        """
+        if not delta:
+            return
+        stack = list(self._parents)             # Walk up the tree iteratively, along every path to the root
+        while stack:
+            folder = stack.pop()
+            folder._size += delta               # Update cached size of the folder
+            stack.extend(folder._parents)       # and continue to its parents
+
+    def _IsWithin(self, folder):
+        """Check whether this component is folder or lies anywhere below it
+
+        Args:
+            folder (Folder): Possible ancestor
+
+        Returns:
+            boolean: Is this component folder or one of its descendants?
+        """
+        stack = [self]
+        seen = set()                            # Components reached along several paths are walked once
+        while stack:                            # Walk up the tree iteratively, along every path to the root
+            component = stack.pop()
+            if component is folder:
+                return True
+            if id(component) not in seen:
+                seen.add(id(component))
+                stack.extend(component._parents)
+        return False
+
     def CalculateSize(self):
         """CalculateSize method to be overriden by children classes
         """
@@ -15,7 +69,7 @@ class File(Component):
         Args:
             size (float): Arbitrary size
         """
-        super().__init__()  # Call parent 'Component' class __init__ to preserve parent initialisation (even though it is currently empty)
+        super().__init__()  # Call parent 'Component' class __init__ to initialise parents array
         self._size = size   # Assign size to private variable
 
     def CalculateSize(self):
@@ -26,23 +80,44 @@ class File(Component):
         """
         return self._size       # Return private size variable
 
+    def Resize(self, size):
+        """Change the size of the file, updating the cached size of every folder containing it
+
+        Args:
+            size (float): New arbitrary size
+        """
+        delta = size - self._size       # Change in size,
+        self._size = size               # assign new size,
+        self._PropagateSize(delta)      # and apply the change along the path to the root
+        events.Emit("Resize", 'Resized {component} to {size}', component=self, size=size)   # Emit feedback event
+
 class Folder(Component):
     """Folder Component Class to represent a folder to contain other components
     """
     def __init__(self):
         """ Initialise component with empty children array
         """
-        super().__init__()      # Call parent 'Component' class __init__ to preserve parent initialisation (even though it is currently empty)
+        super().__init__()      # Call parent 'Component' class __init__ to initialise parents array
         self._children = []     # Initialise empty private children array
+        self._size = 0          # Initialise cached total size of children
     
     def AddChild(self, component):
         """Add component to folder
 
         Args:
             component (Component): Component to be added to folder
+
+        Raises:
+            ValueError: If component is this folder or contains it, as the tree would become a cycle
         """
+        if isinstance(component, Folder) and self._IsWithin(component):
+            raise ValueError(f'{component} contains folder {self}, so cannot be added to it')
         self._children.append(component)                            # Append child component to private children array
-        print(f'Added {str(component)} to folder {str(self)}')      # Print feedback to console
+        component._parents.append(self)                             # Record this folder as a parent of the component
+        size = component.CalculateSize()                            # Cached size of the component
+        self._size += size                                          # Add the component's size to the cached size,
+        self._PropagateSize(size)                                   # and to every folder above this one
+        events.Emit("AddChild", 'Added {component} to folder {folder}', component=component, folder=self)        # Emit feedback event
 
     def RemoveChild(self, component):
         """Remove component from folder
@@ -51,18 +126,752 @@ class Folder(Component):
             component (Component): Component to be removed from folder
         """
         self._children.remove(component)                            # Remove child component from private children array
-        print(f'Removed {str(component)} from folder {str(self)}')  # Print feedback to console
+        component._parents.remove(self)                             # Forget this folder as a parent of the component
+        size = component.CalculateSize()                            # Cached size of the component
+        self._size -= size                                          # Remove the component's size from the cached size,
+        self._PropagateSize(-size)                                  # and from every folder above this one
+        events.Emit("RemoveChild", 'Removed {component} from folder {folder}', component=component, folder=self) # Emit feedback event
     
     def CalculateSize(self):
         """Calculate the size of the folder
 
         Returns:
-            float: Calculated size based on recursive search.
+            float: Cached total size of all children, kept up to date as the tree changes.
+        """
+        if instrumentation.enabled:
+            return _size_probe.Call(None, self._CachedSize)
+        return self._size                       # Return cached total size
+
+    def _CachedSize(self):
+        """Private cached total size of all children"""
+        return self._size
+
+    def IterAggregates(self):
+        """Lazily walk the folder's subtree bottom-up, without recursion, yielding each folder once its subtree is complete
+
+        Yields:
+            tuple: (folder, depth below this folder, total size, file count) for this folder and every folder below it, children first
+        """
+        stack = [[self, 0, iter(self._children), 0]]    # Frames of folder, depth, remaining children, files counted so far
+        while stack:
+            frame = stack[-1]
+            folder, depth, children = frame[0], frame[1], frame[2]
+            for child in children:
+                if isinstance(child, Folder):               # Descend into the folder, resuming this one afterwards
+                    stack.append([child, depth + 1, iter(child._children), 0])
+                    break
+                frame[3] += 1                               # Count the file
+            else:                                           # Every child done, the folder is complete
+                stack.pop()
+                if stack:
+                    stack[-1][3] += frame[3]                # Add its files to its parent's count
+                yield folder, depth, folder.CalculateSize(), frame[3]
+
+    def Aggregate(self, top=10, min_size=None):
+        """Aggregate the folder's subtree in a single bottom-up pass
+
+        Args:
+            top (int): Number of largest folders to find
+            min_size (float): Also list every folder at least this size, None to skip
+
+        Returns:
+            dict: "totals" maps each folder to (total size, file count), "top" lists the (size, folder) pairs of the largest
+            folders, largest first, "over" lists the (size, folder) pairs of folders of at least min_size, "depths" counts the
+            folders at each depth below this folder, and "files" counts every file.
+        """
+        totals = {}
+        heap = []                                           # Smallest of the largest folders so far at the top
+        over = []
+        depths = []
+        files = 0
+        for order, (folder, depth, size, count) in enumerate(self.IterAggregates()):
+            totals[folder] = (size, count)
+            if len(heap) < top:
+                heapq.heappush(heap, (size, order, folder))
+            elif heap and size > heap[0][0]:
+                heapq.heapreplace(heap, (size, order, folder))  # Bounded heap, O(log top) per folder
+            if min_size is not None and size >= min_size:
+                over.append((size, folder))
+            while len(depths) <= depth:
+                depths.append(0)
+            depths[depth] += 1
+            if folder is self:
+                files = count
+        return {
+            "totals": totals,
+            "top": [(size, folder) for size, _, folder in sorted(heap, key=lambda entry: (-entry[0], entry[1]))],
+            "over": over,
+            "depths": depths,
+            "files": files,
+        }
+
+_SNAPSHOT_MAGIC = b"CTREE003"     # Identifies a CompactTree snapshot file
+_SNAPSHOT_HEADER = struct.Struct("<8s8sqq")     # Magic, byte order of the arrays, node count, length of the names table
+_SNAPSHOT_ARRAYS = (("_sizes", 'd'), ("_totals", 'd'), ("_parents", 'q'), ("_first_child", 'q'),
+                    ("_next_sibling", 'q'), ("_prev_sibling", 'q'), ("_mtimes", 'q'), ("_name_ends", 'q'))    # 8-byte arrays in snapshot order
+
+def _CopyArray(typecode, buffer):
+    """Copy any buffer of typecode items into a growable array"""
+    copy = array(typecode)
+    copy.frombytes(memoryview(buffer).cast('B'))
+    return copy
+
+class CompactTree():
+    """Array-backed tree engine for very large Composite trees.
+
+    Every node is a row in flat arrays: its own size, cached total size, parent index, and first child and
+    sibling links, so no per-node Python object exists until a handle is asked for. Handles (CompactFile and
+    CompactFolder) offer the usual Component API on top of the arrays. Unlike Folder, each node has a single parent.
+    """
+    def __init__(self):
+        """Initialise empty tree
+        """
+        self._sizes = array('d')            # Own size of each node (0 for folders)
+        self._totals = array('d')           # Cached total size of each node's subtree
+        self._parents = array('q')          # Parent index of each node (-1 for none)
+        self._first_child = array('q')      # Index of each node's first child (-1 for none)
+        self._next_sibling = array('q')     # Index of each node's next sibling (-1 for none)
+        self._prev_sibling = array('q')     # Index of each node's previous sibling, or of the last sibling for a first child (-1 if detached)
+        self._folders = bytearray()         # Whether each node is a folder
+        self._mtimes = array('q')           # Modification time (ns) of each scanned directory (0 otherwise)
+        self._name_ends = array('q')        # End offset of each node's name in the names table
+        self._names = bytearray()           # UTF-8 names of every node, back to back
+        self._mmap = None                   # Snapshot the arrays are mapped from, if loaded and not yet grown
+
+    @classmethod
+    def FromArrays(cls, parents, sizes, folders):
+        """Bulk build a tree from parallel sequences, then calculate every total in one bottom-up pass
+
+        Args:
+            parents (sequence): Parent index of each node, -1 for roots
+            sizes (sequence): Size of each node, ignored for folders
+            folders (sequence): Whether each node is a folder
+
+        Returns:
+            CompactTree: Tree containing the nodes
+        """
+        tree = cls()
+        count = len(parents)
+        tree._parents = array('q', parents)
+        tree._folders = bytearray(1 if folder else 0 for folder in folders)
+        tree._sizes = array('d', (0 if folder else size for size, folder in zip(sizes, tree._folders)))
+        tree._first_child = array('q', [-1]) * count
+        tree._next_sibling = array('q', [-1]) * count
+        tree._prev_sibling = array('q', [-1]) * count
+        tree._mtimes = array('q', [0]) * count
+        tree._name_ends = array('q', [0]) * count
+        for index in range(count):                      # Children are appended, so siblings keep index order
+            parent = tree._parents[index]
+            if parent >= 0:
+                tree._Link(parent, index)
+        tree.Recalculate()
+        return tree
+
+    @classmethod
+    def FromComponent(cls, component):
+        """Build a compact copy of a Folder/File tree, so it can be saved as a snapshot
+
+        Args:
+            component (Component): Root of the tree to copy. Components with several parents are copied once per parent.
+
+        Returns:
+            CompactTree: Tree whose node 0 is the copy of component
+        """
+        tree = cls()
+        stack = [(component, -1)]
+        while stack:                                                        # Walk the tree iteratively, parents first
+            node, parent = stack.pop()
+            if isinstance(node, Folder):
+                index = tree._Append(0, True)
+                stack.extend((child, index) for child in reversed(node._children))  # Popped, and so appended, in order
+            else:
+                index = tree._Append(node.CalculateSize(), False)
+            if parent >= 0:
+                tree._Link(parent, index)
+        tree.Recalculate()
+        return tree
+
+    @classmethod
+    def Load(cls, path):
+        """Load a snapshot by memory mapping it. Node rows are read straight from the mapping, so nothing is rebuilt up front.
+
+        Changes to a loaded tree are private to the process until it is saved, and the first structural change copies the arrays into memory.
+        A snapshot saved on a host of the other byte order is copied into memory and byte swapped instead.
+
+        Args:
+            path (path): Snapshot written by Save
+
+        Returns:
+            CompactTree: Tree backed by the snapshot
+
+        Raises:
+            ValueError: If the file is not a snapshot
+        """
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)      # Copy-on-write, so sizes can be patched in place
+        magic, byteorder, count, names_length = _SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError(f'{path} is not a CompactTree snapshot')
+        byteorder = byteorder.rstrip(b"\0").decode("ascii")
+        if byteorder not in ("little", "big"):
+            raise ValueError(f'{path} has an unknown byte order {byteorder!r}')
+        tree = cls()
+        view = memoryview(mapped)
+        offset = _SNAPSHOT_HEADER.size
+        for name, typecode in _SNAPSHOT_ARRAYS:                                 # View each array in place
+            setattr(tree, name, view[offset:offset + 8 * count].cast(typecode))
+            offset += 8 * count
+        tree._folders = view[offset:offset + count]
+        offset += count
+        tree._names = view[offset:offset + names_length]
+        tree._mmap = mapped
+        if byteorder != sys.byteorder:                                          # Written on a host of the other byte order
+            tree._Materialise()
+            for name, _ in _SNAPSHOT_ARRAYS:
+                getattr(tree, name).byteswap()
+        return tree
+
+    def Save(self, path):
+        """Save the tree as a binary snapshot, in native byte order recorded in the header. The file is replaced atomically, so a tree may be saved over its own snapshot.
+
+        Rows of removed nodes are saved too, call Compact first to reclaim them.
+
+        Args:
+            path (path): Snapshot file
+        """
+        temporary = f'{path}.tmp'
+        with open(temporary, "wb") as file:
+            file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, sys.byteorder.encode("ascii"), len(self._sizes), len(self._names)))
+            for name, _ in _SNAPSHOT_ARRAYS:
+                file.write(memoryview(getattr(self, name)).cast('B'))
+            file.write(self._folders)
+            file.write(self._names)
+        os.replace(temporary, path)
+
+    def Compact(self, roots=(0,)):
+        """Reclaim the rows of nodes no longer in the tree, e.g. entries a Refresh found removed from disk.
+
+        Only the subtrees of the given roots are kept. Kept nodes stay in the same relative order, so node 0 stays
+        node 0, but other indices and any existing handles are invalidated.
+
+        Args:
+            roots (iterable): Indices of the nodes whose subtrees are kept, each becoming a root
+
+        Returns:
+            array: New index of each old node, -1 for nodes that were dropped
+        """
+        roots = list(roots)
+        count = len(self._sizes)
+        keep = bytearray(count)
+        stack = list(roots)
+        while stack:                                                        # Mark every node below the roots, iteratively
+            index = stack.pop()
+            keep[index] = 1
+            child = self._first_child[index]
+            while child >= 0:
+                stack.append(child)
+                child = self._next_sibling[child]
+
+        kept = [index for index in range(count) if keep[index]]
+        remap = array('q', [-1]) * count
+        for new, old in enumerate(kept):
+            remap[old] = new
+        def Links(links):
+            return array('q', (-1 if links[old] < 0 else remap[links[old]] for old in kept))
+
+        names = bytearray()
+        name_ends = array('q')
+        for old in kept:
+            start = self._name_ends[old - 1] if old else 0
+            names += self._names[start:self._name_ends[old]]
+            name_ends.append(len(names))
+        parents, first_child = Links(self._parents), Links(self._first_child)
+        next_sibling, prev_sibling = Links(self._next_sibling), Links(self._prev_sibling)
+        for root in roots:                                                  # Roots lose their dropped parent and its other children
+            parent = self._parents[root]
+            if parent < 0 or not keep[parent]:
+                parents[remap[root]] = next_sibling[remap[root]] = prev_sibling[remap[root]] = -1
+        self._parents, self._first_child, self._next_sibling, self._prev_sibling = parents, first_child, next_sibling, prev_sibling
+        self._sizes = array('d', (self._sizes[old] for old in kept))
+        self._totals = array('d', (self._totals[old] for old in kept))
+        self._mtimes = array('q', (self._mtimes[old] for old in kept))
+        self._folders = bytearray(self._folders[old] for old in kept)
+        self._names, self._name_ends = names, name_ends
+        self._mmap = None                                                   # Nothing refers to the snapshot any more
+        return remap
+
+    def NewFile(self, size, name=""):
+        """Add a detached file node
+
+        Args:
+            size (float): Arbitrary size
+            name (string): Name of the file
+
+        Returns:
+            CompactFile: Handle to the new file
+        """
+        return CompactFile(self, self._Append(size, False, name))
+
+    def NewFolder(self, name=""):
+        """Add a detached, empty folder node
+
+        Args:
+            name (string): Name of the folder
+
+        Returns:
+            CompactFolder: Handle to the new folder
+        """
+        return CompactFolder(self, self._Append(0, True, name))
+
+    def Node(self, index):
+        """Get a handle to an existing node
+
+        Args:
+            index (int): Index of the node
+
+        Returns:
+            Component: CompactFolder or CompactFile handle
+        """
+        return CompactFolder(self, index) if self._folders[index] else CompactFile(self, index)
+
+    def Recalculate(self):
+        """Recalculate every cached total with an iterative bottom-up pass, children before their parents
+        """
+        totals = _CopyArray('d', self._sizes)
+        parents = self._parents
+        for index in reversed(self._TopologicalOrder()):    # Every child is reached before its parent,
+            parent = parents[index]
+            if parent >= 0:
+                totals[parent] += totals[index]             # so its total is complete when added to the parent.
+        self._totals = totals
+
+    def _TopologicalOrder(self):
+        """Order nodes so every parent comes before its children, without recursion
+
+        Returns:
+            array: Node indices, parents first
+        """
+        order = array('q', (index for index, parent in enumerate(self._parents) if parent < 0))     # Start from the roots
+        first_child, next_sibling = self._first_child, self._next_sibling
+        position = 0
+        while position < len(order):                        # Breadth-first, appending each node's children
+            child = first_child[order[position]]
+            while child >= 0:
+                order.append(child)
+                child = next_sibling[child]
+            position += 1
+        return order
+
+    def _Name(self, index):
+        """Get the name of a node"""
+        start = self._name_ends[index - 1] if index else 0
+        return bytes(self._names[start:self._name_ends[index]]).decode("utf-8")
+
+    def _Path(self, index):
+        """Get the path of a node, joining the names from its root down"""
+        names = []
+        while index >= 0:
+            names.append(self._Name(index))
+            index = self._parents[index]
+        return os.path.join(*reversed(names))
+
+    def _Materialise(self):
+        """Copy arrays mapped from a snapshot into growable arrays"""
+        for name, typecode in _SNAPSHOT_ARRAYS:
+            setattr(self, name, _CopyArray(typecode, getattr(self, name)))
+        self._folders = bytearray(self._folders)
+        self._names = bytearray(self._names)
+        self._mmap = None
+
+    def _Append(self, size, folder, name=""):
+        """Add a detached node row to every array
+
+        Returns:
+            int: Index of the new node
         """
-        size = 0                                # Set intial size to 0
-        for child in self._children:            # Loop through all children
-            size += child.CalculateSize()       # Calculate size of children and add to total size
-        return size                             # return total calculated size
+        if self._mmap is not None:          # Snapshot views cannot grow
+            self._Materialise()
+        self._names += name.encode("utf-8")
+        self._name_ends.append(len(self._names))
+        self._mtimes.append(0)
+        self._sizes.append(size)
+        self._totals.append(size)
+        self._parents.append(-1)
+        self._first_child.append(-1)
+        self._next_sibling.append(-1)
+        self._prev_sibling.append(-1)
+        self._folders.append(1 if folder else 0)
+        return len(self._sizes) - 1
+
+    def _Link(self, parent, child):
+        """Make child the last child of parent, without updating totals. The first child's previous sibling link points at the last child."""
+        first = self._first_child[parent]
+        self._parents[child] = parent
+        self._next_sibling[child] = -1
+        if first < 0:                                   # Only child, so also its own last sibling
+            self._first_child[parent] = child
+            self._prev_sibling[child] = child
+            return
+        last = self._prev_sibling[first]
+        self._next_sibling[last] = child
+        self._prev_sibling[child] = last
+        self._prev_sibling[first] = child               # New last child
+
+    def _Unlink(self, child):
+        """Detach child from its parent, without updating totals"""
+        parent = self._parents[child]
+        first = self._first_child[parent]
+        before, after = self._prev_sibling[child], self._next_sibling[child]
+        if child == first:                              # Its successor becomes first, and inherits the link to the last child
+            self._first_child[parent] = after
+            if after >= 0:
+                self._prev_sibling[after] = before
+        else:
+            self._next_sibling[before] = after
+            if after >= 0:
+                self._prev_sibling[after] = before
+            else:                                       # Was the last child
+                self._prev_sibling[first] = before
+        self._parents[child] = self._prev_sibling[child] = self._next_sibling[child] = -1
+
+    def _Attach(self, parent, child):
+        """Link a detached child under parent and add its size to every node above it"""
+        self._Link(parent, child)
+        self._totals[parent] += self._totals[child]
+        self._Propagate(parent, self._totals[child])
+
+    def _Detach(self, child):
+        """Unlink a child from its parent and remove its size from every node above it"""
+        parent = self._parents[child]
+        self._Unlink(child)
+        self._totals[parent] -= self._totals[child]
+        self._Propagate(parent, -self._totals[child])
+
+    def _Propagate(self, index, delta):
+        """Add a change in size to the cached total of every node above index"""
+        parent = self._parents[index]
+        while parent >= 0:                  # Walk up the tree iteratively
+            self._totals[parent] += delta
+            parent = self._parents[parent]
+
+class CompactFile(Component):
+    """Handle to a file node of a CompactTree
+    """
+    __slots__ = ("_tree", "_index")
+
+    def __init__(self, tree, index):
+        """Initialise handle
+
+        Args:
+            tree (CompactTree): Tree containing the node
+            index (int): Index of the node
+        """
+        self._tree = tree       # Tree containing the node
+        self._index = index     # Row of the node in the tree's arrays
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._tree is self._tree and other._index == self._index
+
+    def __hash__(self):
+        return hash((id(self._tree), self._index))
+
+    def GetName(self):
+        """Get the name of the node
+
+        Returns:
+            string: Name given when the node was created
+        """
+        return self._tree._Name(self._index)
+
+    def CalculateSize(self):
+        """Returns the size of the file
+
+        Returns:
+            float: Arbitrary size of the file
+        """
+        return self._tree._totals[self._index]
+
+    def Resize(self, size):
+        """Change the size of the file, updating the cached size of every folder containing it
+
+        Args:
+            size (float): New arbitrary size
+        """
+        tree = self._tree
+        delta = size - tree._sizes[self._index]
+        tree._sizes[self._index] = size
+        tree._totals[self._index] = size
+        tree._Propagate(self._index, delta)
+        events.Emit("Resize", 'Resized {component} to {size}', component=self, size=size)   # Emit feedback event
+
+class CompactFolder(CompactFile):
+    """Handle to a folder node of a CompactTree
+    """
+    __slots__ = ()
+
+    def Resize(self, size):
+        """Folders take their size from their children, so cannot be resized
+        """
+        raise TypeError("Folders cannot be resized")
+
+    def AddChild(self, component):
+        """Add component to folder
+
+        Args:
+            component (CompactFile or CompactFolder): Detached node of the same tree
+
+        Raises:
+            ValueError: If component is of another tree, already has a parent, or is this folder or contains it
+        """
+        tree = self._tree
+        if component._tree is not tree:
+            raise ValueError("Component belongs to a different tree")
+        if tree._parents[component._index] >= 0:
+            raise ValueError("Component already has a parent")
+        ancestor = self._index
+        while ancestor >= 0:                                            # A root may be attached anywhere but below itself
+            if ancestor == component._index:
+                raise ValueError(f'{component} contains folder {self}, so cannot be added to it')
+            ancestor = tree._parents[ancestor]
+        tree._Attach(self._index, component._index)                     # Link the component and add its size up to the root
+        events.Emit("AddChild", 'Added {component} to folder {folder}', component=component, folder=self)        # Emit feedback event
+
+    def RemoveChild(self, component):
+        """Remove component from folder
+
+        Args:
+            component (CompactFile or CompactFolder): Child of this folder
+        """
+        tree = self._tree
+        if component._tree is not tree or tree._parents[component._index] != self._index:
+            raise ValueError("Component is not a child of this folder")
+        tree._Detach(component._index)                                  # Unlink the component and remove its size up to the root
+        events.Emit("RemoveChild", 'Removed {component} from folder {folder}', component=component, folder=self) # Emit feedback event
+
+    def GetChildren(self):
+        """Get handles to the folder's children
+
+        Returns:
+            list: CompactFile and CompactFolder handles
+        """
+        tree = self._tree
+        children = []
+        child = tree._first_child[self._index]
+        while child >= 0:
+            children.append(tree.Node(child))
+            child = tree._next_sibling[child]
+        return children
+
+class FileSystemScanner():
+    """Scanner building a Folder/File or CompactTree tree from a real directory.
+
+    Directories are read concurrently on a thread pool. File sizes come from the stat results os.scandir
+    already holds, and each directory's nodes are added to the tree as soon as it has been read, so sizes
+    grow while the scan runs. Only the calling thread changes the tree.
+    """
+    def __init__(self, workers=None):
+        """Initialise scanner
+
+        Args:
+            workers (int): Number of scanning threads, defaults to ThreadPoolExecutor's default.
+        """
+        self._workers = workers             # Number of scanning threads
+        self._folders = {}                  # Directory path -> Folder of the last Folder scan
+        self._mtimes = {}                   # Directory path -> modification time (ns) of the last Folder scan
+        self._errors = []                   # (path, OSError) for directories and entries that could not be read
+
+    def Scan(self, path):
+        """Scan a directory tree into Folder and File components
+
+        Args:
+            path (path): Directory to scan
+
+        Returns:
+            Folder: Folder representing the directory
+        """
+        root = Folder()
+        self._folders = {}
+        self._mtimes = {}
+        self._errors = []
+        self._ScanAll([(os.fspath(path), root)], self._AddToFolder)
+        return root
+
+    def ScanCompact(self, path):
+        """Scan a directory tree into a CompactTree, recording names and directory mtimes so it can be refreshed
+
+        Args:
+            path (path): Directory to scan
+
+        Returns:
+            CompactTree: Tree whose node 0 represents the directory
+        """
+        path = os.path.abspath(path)
+        tree = CompactTree()
+        self._errors = []
+        self._ScanAll([(path, tree._Append(0, True, path))], lambda path, index, listing: self._Patch(tree, path, index, listing))
+        return tree
+
+    def Refresh(self, tree, root=0):
+        """Bring a scanned (or loaded) CompactTree up to date with the disk.
+
+        Every directory is stat'ed on the thread pool, but only directories whose mtime changed are read again. Their entries are
+        patched in place: file sizes updated, new entries added and missing ones removed. New subdirectories are
+        scanned in full. A file rewritten in place does not change its directory's mtime, so is not noticed.
+        Rows of removed entries stay in the arrays until tree.Compact() is called.
+
+        Args:
+            tree (CompactTree): Tree built by ScanCompact
+            root (int): Index of the directory node to refresh below
+        """
+        self._errors = []
+        directories = []
+        stack = [(tree._Path(root), root)]
+        while stack:                                                                # Collect every directory, iteratively
+            path, index = stack.pop()
+            directories.append((path, index))
+            child = tree._first_child[index]
+            while child >= 0:                                                       # Subdirectories may have changed independently
+                if tree._folders[child]:
+                    stack.append((os.path.join(path, tree._Name(child)), child))
+                child = tree._next_sibling[child]
+
+        changed = []
+        with ThreadPoolExecutor(self._workers) as executor:                        # Stat them all on the thread pool
+            stats = [executor.submit(os.stat, path) for path, _ in directories]
+            for (path, index), stat in zip(directories, stats):
+                try:
+                    mtime = stat.result().st_mtime_ns
+                except FileNotFoundError:                                           # Removed, its parent has changed too
+                    continue
+                except OSError as error:
+                    self._errors.append((path, error))
+                    continue
+                if mtime != tree._mtimes[index]:
+                    changed.append((path, index))
+        self._ScanAll(changed, lambda path, index, listing: self._Patch(tree, path, index, listing))
+
+    def GetFolders(self):
+        """Get the folder of every directory in the last Folder scan
+
+        Returns:
+            dict: Directory path -> Folder
+        """
+        return self._folders
+
+    def GetErrors(self):
+        """Get the directories and entries that could not be read
+
+        Returns:
+            list: (path, OSError) pairs
+        """
+        return self._errors
+
+    def _ScanAll(self, directories, add):
+        """Read directories, and any subdirectories found, on the thread pool
+
+        Args:
+            directories (list): (path, node) pairs to read
+            add (function): Called on this thread with (path, node, listing) as each directory is read. Returns (path, node) pairs of subdirectories to read.
+        """
+        with ThreadPoolExecutor(self._workers) as executor:
+            pending = {executor.submit(_ListDirectory, path): (path, node) for path, node in directories}
+            while pending:                                                          # Until every directory has been read,
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, node = pending.pop(future)
+                    try:
+                        listing = future.result()
+                    except OSError as error:
+                        self._errors.append((path, error))
+                        continue
+                    self._errors.extend((os.path.join(path, name), error) for name, error in listing[3])
+                    for subpath, subnode in add(path, node, listing):               # add its nodes and read the subdirectories it found.
+                        pending[executor.submit(_ListDirectory, subpath)] = (subpath, subnode)
+
+    def _AddToFolder(self, path, folder, listing):
+        """Add a directory's listing to its Folder
+
+        Returns:
+            list: (path, Folder) pairs of subdirectories to read
+        """
+        mtime, files, directories, _ = listing
+        self._folders[path] = folder
+        self._mtimes[path] = mtime
+        for _, size in files:
+            folder.AddChild(File(size))
+        subdirectories = []
+        for name in directories:
+            subfolder = Folder()
+            folder.AddChild(subfolder)
+            subdirectories.append((os.path.join(path, name), subfolder))
+        return subdirectories
+
+    def _Patch(self, tree, path, index, listing):
+        """Make a CompactTree directory node match a directory's listing
+
+        Returns:
+            list: (path, index) pairs of new subdirectories to read
+        """
+        mtime, files, directories, skipped = listing
+        tree._mtimes[index] = mtime
+        existing = {}                                                               # Name -> index of current children
+        child = tree._first_child[index]
+        while child >= 0:
+            existing[tree._Name(child)] = child
+            child = tree._next_sibling[child]
+        for name, _ in skipped:                                                     # Unreadable entries are left as they were
+            existing.pop(name, None)
+
+        delta = 0
+        for name, size in files:
+            child = existing.pop(name, None)
+            if child is not None and not tree._folders[child]:                      # Known file, patch its size in place
+                delta += size - tree._sizes[child]
+                tree._sizes[child] = tree._totals[child] = size
+                continue
+            if child is not None:                                                   # Was a directory
+                tree._Detach(child)
+            tree._Attach(index, tree._Append(size, False, name))
+        subdirectories = []
+        for name in directories:
+            child = existing.pop(name, None)
+            if child is not None and tree._folders[child]:                          # Known directory, refreshed separately
+                continue
+            if child is not None:                                                   # Was a file
+                tree._Detach(child)
+            child = tree._Append(0, True, name)
+            tree._Attach(index, child)
+            subdirectories.append((os.path.join(path, name), child))
+        for child in existing.values():                                             # No longer on disk
+            tree._Detach(child)
+        if delta:
+            tree._totals[index] += delta
+            tree._Propagate(index, delta)
+        return subdirectories
+
+def _ListDirectory(path):
+    """Read a directory, on a scanning thread
+
+    Args:
+        path (path): Directory to read
+
+    Returns:
+        tuple: (mtime in ns, [(file name, size)], [subdirectory name], [(entry name, OSError)] of skipped entries)
+    """
+    mtime = os.stat(path).st_mtime_ns
+    files = []
+    directories = []
+    skipped = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.name)
+                else:                                                               # Sized from the scandir stat result
+                    files.append((entry.name, entry.stat(follow_symlinks=False).st_size))
+            except OSError as error:                                                # Skip the entry, not the whole directory
+                skipped.append((entry.name, error))
+    return mtime, files, directories, skipped
 
 """ Client """
 if __name__ == "__main__":
@@ -110,8 +919,40 @@ if __name__ == "__main__":
     print(f'Root Folder Size: {root_folder.CalculateSize()}')
     print(f'folder1 Folder Size: {folder1.CalculateSize()}')
     print(f'folder2 Folder Size: {folder2.CalculateSize()}\n')
+    """ Aggregating the whole tree in one pass """
+    aggregate = root_folder.Aggregate(top=2)
+    print(f'Largest Folders: {[size for size, _ in aggregate["top"]]}, Files: {aggregate["files"]}, Folders per depth: {aggregate["depths"]}\n')
+    """ Resizing a file deep in the tree """
+    file4.Resize(45)
+    print(f'Root Folder Size: {root_folder.CalculateSize()}')
+    print(f'folder1 Folder Size: {folder1.CalculateSize()}')
+    print(f'folder2 Folder Size: {folder2.CalculateSize()}\n')
     """ Removing whole folders from folders """
     root_folder.RemoveChild(folder1)
     print(f'Root Folder Size: {root_folder.CalculateSize()}')
     print(f'folder1 Folder Size: {folder1.CalculateSize()}')
-    print(f'folder2 Folder Size: {folder2.CalculateSize()}\n')
\ No newline at end of file
+    print(f'folder2 Folder Size: {folder2.CalculateSize()}\n')
+
+    """ Compact tree of a hundred thousand files, built in bulk """
+    folder_count, file_count = 100, 100000
+    parents = [-1] + [0] * folder_count + [1 + index % folder_count for index in range(file_count)]
+    folders = [True] * (folder_count + 1) + [False] * file_count
+    sizes = [0] * (folder_count + 1) + [1] * file_count
+    compact_tree = CompactTree.FromArrays(parents, sizes, folders)
+    print(f'Compact Root Folder Size: {compact_tree.Node(0).CalculateSize()}')
+
+    """ Scanning a real directory into a Folder tree """
+    events.SetSink(events.NullSink())                   # Silence the feedback of every node added
+    scanner = FileSystemScanner()
+    scanned_folder = scanner.Scan(os.path.dirname(os.path.abspath(__file__)))
+    print(f'Scanned Folder Size: {scanned_folder.CalculateSize()} bytes in {len(scanner.GetFolders())} directories')
+
+    """ Saving a compact scan as a snapshot, then reloading and refreshing it """
+    snapshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenario6.snapshot")
+    scanner.ScanCompact(os.path.dirname(os.path.abspath(__file__))).Save(snapshot_path)
+    snapshot_tree = CompactTree.Load(snapshot_path)
+    scanner.Refresh(snapshot_tree)                      # Only the directory holding the new snapshot has changed
+    print(f'Refreshed Snapshot Size: {snapshot_tree.Node(0).CalculateSize()} bytes')
+    snapshot_tree.Compact()                             # Reclaim rows of removed entries before saving again
+    snapshot_tree.Save(snapshot_path)
+    os.remove(snapshot_path)
@@ -1,6 +1,42 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import re
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import Xavier_COM6031_Events as events
+import Xavier_COM6031_Instrumentation as instrumentation
+
+_handle_probe = instrumentation.GetProbe("TicketHandler.HandleTicket")    # Counts tickets by the handler resolving them
+_TOKEN = re.compile(r"\w+")     # A single word, as every rule keyword must be
+_SCAN_KEYWORDS = 32             # Largest rules table routed by scanning for each keyword, larger tables use the word index
+
+def NormaliseTicket(ticket):
+    """Cache key of a ticket, so tickets differing only in spacing share one routing decision.
+
+    Runs of whitespace are collapsed to a single space and leading and trailing whitespace dropped, which cannot
+    change which keywords a ticket contains as long as no keyword contains whitespace.
+
+    Args:
+        ticket (string): Ticket to be normalised
+
+    Returns:
+        string: Normalised ticket text
+    """
+    return " ".join(ticket.split())
+
 class TicketHandler():
     """Generic Ticket Handler which defines calling successor behaviour
     """
+    _keywords = None        # Keywords accepted by this handler (None if the handler is not keyword based)
+    _catch_all = False      # Whether this handler accepts every ticket it is given
+    _level = None           # Support level reported for tickets accepted by this handler
+    _generation = 0         # Incremented whenever any chain is rebuilt, so routing caches know to invalidate
+
     def __init__(self, successor):
         """Initialise private successor variable
 
@@ -15,19 +51,91 @@ class TicketHandler():
         Args:
             ticket (string): String description of support ticket
         """
-        handled = self._HandleTicket(ticket)        # Call private handling function and store result
+        if instrumentation.enabled:                             # Time the whole chain once, from the entry handler
+            return _handle_probe.Call(None, self._HandleInChain, ticket)
+        return self._HandleInChain(ticket)
+
+    def _HandleInChain(self, ticket):
+        """Private handling of the ticket by this handler or its successors
+
+        Args:
+            ticket (string): String description of support ticket
+        """
+        handled = _Synchronous(self._HandleTicket(ticket), self)    # Call private handling function and store result
 
         if not handled:                             # If not handled by this handler,
-            self._successor.HandleTicket(ticket)    # send the request to the successor.
+            self._successor._HandleInChain(ticket)  # send the request to the successor.
+        elif instrumentation.enabled:
+            _handle_probe.Count(type(self).__name__)    # Count the ticket against the handler that resolved it
+
+    def SetSuccessor(self, successor):
+        """Rebuild the chain by replacing this handler's successor
+
+        Args:
+            successor (TicketHandler): New Ticket Handler to handle the request if not handled by current handler.
+        """
+        self._successor = successor         # Replace successor
+        TicketHandler._generation += 1      # Invalidate routing decisions cached for the old chain
+
+    def Route(self, ticket):
+        """Find the handler in this chain that would accept the ticket, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            TicketHandler: Handler that accepts the ticket, or None if no handler does
+        """
+        handler = self
+        while handler is not None and not handler._Accepts(ticket):    # Walk the chain until a handler accepts the ticket
+            handler = handler._successor
+        return handler
 
     def _HandleTicket(self, ticket):
         """Private ticket handler to be overridden by child classes
         """
         pass
 
+    def _Accepts(self, ticket):
+        """Private check of whether this handler accepts the ticket, based on its keywords
+
+        Args:
+            ticket (string): Ticket to be checked
+
+        Returns:
+            boolean: Ticket accepted?
+        """
+        if self._catch_all:
+            return True
+        return self._keywords is not None and any(keyword in ticket for keyword in self._keywords)
+
+    def _Resolve(self, ticket):
+        """Private resolution of a ticket this handler has accepted, to be overridden by child classes
+        """
+        pass
+
+    def Compile(self):
+        """Compile this chain into a flattened keyword router
+
+        Returns:
+            CompiledTicketRouter: Router equivalent to this chain
+        """
+        return CompiledTicketRouter(self)
+
+    def RouteMany(self, tickets, workers=None, chunk_size=1000, ordered=True):
+        """Route a stream of tickets across a process pool, see CompiledTicketRouter.RouteMany
+
+        Returns:
+            generator: (ticket_id, handler_level) results
+        """
+        return self.Compile().RouteMany(tickets, workers, chunk_size, ordered)
+
 class Level1(TicketHandler):
     """Simple ticket handler
     """
+    _keywords = ("error",)
+    _level = 1
+
     def _HandleTicket(self, ticket):
         """Private ticket handler
 
@@ -37,15 +145,26 @@ class Level1(TicketHandler):
         Returns:
             boolean: Ticket handled?
         """
-        if "error" in ticket:                                                   # If the ticket contains "error",
-            print(f'Support Ticket: "{ticket}" handled by Level 1 support')     # Print feedback to console,
-            # Handle Support Ticket here
+        if self._Accepts(ticket):                                               # If the ticket contains any of this level's keywords,
+            self._Resolve(ticket)                                               # Resolve the ticket,
             return True                                                         # Return true to indicate ticket has been handled
         return False                                                            # Otherwise return false to indicate ticket has NOT been handled
 
+    def _Resolve(self, ticket):
+        """Private resolution of an accepted ticket
+
+        Args:
+            ticket (string): Ticket to be resolved
+        """
+        events.Emit("HandleTicket", 'Support Ticket: "{ticket}" handled by Level 1 support', ticket=ticket, level=1)    # Emit feedback event
+        # Handle Support Ticket here
+
 class Level2(TicketHandler):
     """Moderate ticket handler
     """
+    _keywords = ("issue", "warning")
+    _level = 2
+
     def _HandleTicket(self, ticket):
         """Private ticket handler
 
@@ -55,15 +174,26 @@ class Level2(TicketHandler):
         Returns:
             boolean: Ticket handled?
         """
-        if (("issue" in ticket) or ("warning" in ticket)):                      # If the ticket contains "issue" or "warning",
-            print(f'Support Ticket: "{ticket}" handled by Level 2 support')     # Print feedback to console,
-            # Handle Support Ticket here
+        if self._Accepts(ticket):                                               # If the ticket contains any of this level's keywords,
+            self._Resolve(ticket)                                               # Resolve the ticket,
             return True                                                         # Return true to indicate ticket has been handled
         return False                                                            # Otherwise return false to indicate ticket has NOT been handled
 
+    def _Resolve(self, ticket):
+        """Private resolution of an accepted ticket
+
+        Args:
+            ticket (string): Ticket to be resolved
+        """
+        events.Emit("HandleTicket", 'Support Ticket: "{ticket}" handled by Level 2 support', ticket=ticket, level=2)    # Emit feedback event
+        # Handle Support Ticket here
+
 class Level3(TicketHandler):
     """Complex ticket handler
     """
+    _keywords = ("feature", "critical")
+    _level = 3
+
     def _HandleTicket(self, ticket):
         """Private ticket handler
 
@@ -73,17 +203,27 @@ class Level3(TicketHandler):
         Returns:
             boolean: Ticket handled?
         """
-        if (("feature" in ticket) or ("critical" in ticket)):                   # If the ticket contains "feature" or "critical",
-            print(f'Support Ticket: "{ticket}" handled by Level 3 support')     # Print feedback to console,
-            # Handle Support Ticket here
+        if self._Accepts(ticket):                                               # If the ticket contains any of this level's keywords,
+            self._Resolve(ticket)                                               # Resolve the ticket,
             return True                                                         # Return true to indicate ticket has been handled
         return False                                                            # Otherwise return false to indicate ticket has NOT been handled
 
+    def _Resolve(self, ticket):
+        """Private resolution of an accepted ticket
+
+        Args:
+            ticket (string): Ticket to be resolved
+        """
+        events.Emit("HandleTicket", 'Support Ticket: "{ticket}" handled by Level 3 support', ticket=ticket, level=3)    # Emit feedback event
+        # Handle Support Ticket here
+
 class DefaultHandler(TicketHandler):
     """Default ticket handler
     """
+    _catch_all = True
+    _level = 0              # Customer management
+
     def _HandleTicket(self, ticket):
-        
         """Private ticket handler
 
         Args:
@@ -92,10 +232,797 @@ class DefaultHandler(TicketHandler):
         Returns:
             boolean: Ticket handled?
         """
-        print(f'Support Ticket: "{ticket}" handled by customer management')     # Print feedback to console
-        # Handle Support Ticket here
+        self._Resolve(ticket)                                                   # Resolve the ticket,
         return True                                                             # Return true to indicate ticket has been handled
-        
+
+    def _Resolve(self, ticket):
+        """Private resolution of an accepted ticket
+
+        Args:
+            ticket (string): Ticket to be resolved
+        """
+        events.Emit("HandleTicket", 'Support Ticket: "{ticket}" handled by customer management', ticket=ticket, level=0)    # Emit feedback event
+        # Handle Support Ticket here
+
+class AsyncTicketHandler(TicketHandler):
+    """Ticket Handler whose handling may be a coroutine, for I/O-bound resolution (database writes, notifications)
+
+    Combine with a concrete handler to make it asynchronous, e.g. class AsyncLevel1(AsyncTicketHandler, Level1).
+    A chain containing one must be handled by awaiting an asynchronous first handler or through AsyncTicketPipeline,
+    synchronous handling raises TypeError on reaching it.
+    """
+    async def HandleTicket(self, ticket):
+        """Asynchronous Handle ticket behaviour not to be overridden
+
+        Args:
+            ticket (string): String description of support ticket
+        """
+        handler = self
+        while handler is not None:                              # Walk the chain here, so later asynchronous handlers are awaited too
+            if await _Await(handler._HandleTicket(ticket)):     # Call each private handling function and await result
+                if instrumentation.enabled:
+                    _handle_probe.Count(type(handler).__name__) # Count the ticket against the handler that resolved it
+                return
+            handler = handler._successor                        # Otherwise send the request to the successor
+
+    async def _HandleTicket(self, ticket):
+        """Private asynchronous ticket handler
+
+        Args:
+            ticket (string): Ticket to be handled
+
+        Returns:
+            boolean: Ticket handled?
+        """
+        if self._Accepts(ticket):                   # If this handler accepts the ticket,
+            await _Await(self._Resolve(ticket))     # resolve it, awaiting the resolution if it is a coroutine,
+            return True                             # and return true to indicate ticket has been handled
+        return False                                # Otherwise return false to indicate ticket has NOT been handled
+
+class AsyncTicketPipeline():
+    """Asyncio pipeline running each handler of a chain as its own stage.
+
+    Every stage has a bounded queue and a pool of workers. A ticket not handled at one stage is passed to
+    the next stage's queue, and a full queue blocks the stage before it, so a slow handler throttles the
+    input rather than letting queued tickets grow without limit.
+    """
+    def __init__(self, chain, workers=4, queue_size=100):
+        """Initialise pipeline stages from the chain
+
+        Args:
+            chain (TicketHandler): First handler of the chain, synchronous or asynchronous handlers
+            workers (int or list): Concurrent workers per stage, either one count for every stage or one per handler
+            queue_size (int): Maximum number of tickets waiting at each stage
+        """
+        self._handlers = []
+        handler = chain
+        while handler is not None:                  # Each handler in the chain becomes a stage
+            self._handlers.append(handler)
+            handler = handler._successor
+        if isinstance(workers, int):
+            workers = [workers] * len(self._handlers)
+        workers = list(workers)
+        if len(workers) != len(self._handlers):
+            raise ValueError(f'Expected {len(self._handlers)} worker counts, one per handler, but got {len(workers)}')
+        if any(count < 1 for count in workers):
+            raise ValueError('Every stage needs at least one worker')
+        self._workers = workers                     # Workers per stage
+        self._queue_size = queue_size               # Bound on each stage's queue
+
+    async def Run(self, tickets, on_result=None):
+        """Handle every ticket through the pipeline
+
+        Args:
+            tickets (iterable or async iterable): Ticket strings, or (ticket_id, ticket) pairs. Plain strings are identified by their position.
+            on_result (function): Called with (ticket_id, handler_level) as each ticket is handled. Results are collected and returned if not given.
+
+        Returns:
+            list: (ticket_id, handler_level) results in completion order, or None if on_result is given
+        """
+        results = [] if on_result is None else None
+        report = results.append if on_result is None else on_result
+        queues = [asyncio.Queue(self._queue_size) for _ in self._handlers]
+        failure = asyncio.get_running_loop().create_future()   # Set by the first handler to raise
+        workers = [asyncio.create_task(self._Work(stage, queues, report, failure))
+                   for stage, count in enumerate(self._workers) for _ in range(count)]
+        feeding = asyncio.create_task(self._Feed(tickets, queues))
+        try:
+            await asyncio.wait([feeding, failure], return_when=asyncio.FIRST_COMPLETED)
+            if failure.done():
+                failure.result()                                # Re-raise the handler's exception
+            feeding.result()
+        finally:
+            feeding.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(feeding, *workers, return_exceptions=True)
+        return results
+
+    async def _Feed(self, tickets, queues):
+        """Feed tickets into the first stage and wait for every stage to drain
+
+        Args:
+            tickets (iterable or async iterable): Ticket strings, or (ticket_id, ticket) pairs
+            queues (list): Queue of every stage
+        """
+        index = 0
+        if hasattr(tickets, "__aiter__"):
+            async for ticket in tickets:
+                await queues[0].put(ticket if isinstance(ticket, tuple) else (index, ticket))     # Blocks while the first stage is full
+                index += 1
+        else:
+            for ticket in tickets:
+                await queues[0].put(ticket if isinstance(ticket, tuple) else (index, ticket))     # Blocks while the first stage is full
+                index += 1
+        for queue in queues:                    # Stages drain in order, as a ticket is only marked done once passed on
+            await queue.join()
+
+    async def _Work(self, stage, queues, report, failure):
+        """Worker handling tickets from one stage's queue
+
+        Args:
+            stage (int): Index of the stage's handler
+            queues (list): Queue of every stage
+            report (function): Called with (ticket_id, handler_level) once a ticket is handled
+            failure (asyncio.Future): Receives the first exception raised by a handler
+        """
+        handler = self._handlers[stage]
+        queue = queues[stage]
+        while True:
+            ticket_id, ticket = await queue.get()
+            try:
+                if await _Await(handler._HandleTicket(ticket)):            # Handled at this stage
+                    report((ticket_id, handler._level))
+                elif stage + 1 < len(queues):
+                    await queues[stage + 1].put((ticket_id, ticket))        # Pass on, waiting while the next stage is full
+                else:
+                    report((ticket_id, None))                               # Not handled by any stage
+            except Exception as error:
+                if not failure.done():
+                    failure.set_exception(error)                            # Stop the pipeline rather than stalling it
+            finally:
+                queue.task_done()
+
+def _Synchronous(result, handler):
+    """Return the result of a synchronous handler, raising if an asynchronous handler was called synchronously
+
+    Raises:
+        TypeError: If the result is awaitable, as the ticket would otherwise be silently dropped
+    """
+    if inspect.isawaitable(result):
+        if inspect.iscoroutine(result):
+            result.close()                          # Discard without a "never awaited" warning
+        raise TypeError(f'{type(handler).__name__} is asynchronous, await the chain or use AsyncTicketPipeline to handle tickets with it')
+    return result
+
+async def _Await(result):
+    """Await the result if it is awaitable, so synchronous and asynchronous handlers can be mixed"""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+class CompiledTicketRouter():
+    """Flattened router equivalent to a chain of keyword based ticket handlers.
+
+    Every handler's keywords are gathered into one table in chain order, so routing a ticket is a run of
+    C-level substring scans with no per-handler calls, stopping at the first keyword found. A single regular
+    expression alternation was measured to be several times slower than this, as it is tried at every position.
+    The router recompiles itself before routing if any chain has been rebuilt since it was compiled.
+    """
+    def __init__(self, chain):
+        """Compile the given chain of ticket handlers
+
+        Args:
+            chain (TicketHandler): First handler of the chain to compile
+
+        Raises:
+            ValueError: If a handler in the chain is neither keyword based nor a catch-all handler, or matches keywords its own way
+        """
+        self._chain = chain         # Chain compiled, kept to recompile it once rebuilt
+        self._Compile()
+
+    def _Compile(self):
+        """Gather the chain's handlers and build the keyword table"""
+        self._generation = TicketHandler._generation    # Chain generation the table is valid for
+        self._handlers = []         # Keyword handlers in chain order
+        self._fallback = None       # Catch-all handler reached if no keyword matches
+        handler = self._chain
+        while handler is not None:                                                  # Walk the chain in order,
+            if handler._catch_all:                                                  # a catch-all handler ends the reachable chain,
+                self._fallback = handler
+                break
+            if handler._keywords is None:                                           # and a handler without keywords cannot be compiled,
+                raise ValueError(f'{type(handler).__name__} is not keyword based and cannot be compiled')
+            if type(handler)._Accepts is not TicketHandler._Accepts:                # nor can one that would not match by substring.
+                raise ValueError(f'{type(handler).__name__} matches keywords its own way and cannot be compiled into a substring router')
+            self._handlers.append(handler)
+            handler = handler._successor
+        self._Build()
+
+    def _Build(self):
+        """Build the (keyword, handler) table, earliest handler first"""
+        table = {}
+        for handler in self._handlers:
+            for keyword in handler._keywords:
+                table.setdefault(keyword, handler)                                  # Earlier handlers take precedence
+        self._table = tuple(table.items())
+
+    def Route(self, ticket):
+        """Find the handler the chain would give the ticket to, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            TicketHandler: Handler that accepts the ticket, or None if no handler does
+        """
+        if self._generation != TicketHandler._generation:                          # A chain has been rebuilt since compiling
+            self._Compile()
+        for keyword, handler in self._table:                                        # Keywords in chain order, so the first found wins
+            if keyword in ticket:
+                return handler
+        return self._fallback
+
+    def HandleTicket(self, ticket):
+        """Route the ticket and resolve it with the accepting handler
+
+        Args:
+            ticket (string): String description of support ticket
+
+        Returns:
+            TicketHandler: Handler that resolved the ticket, or None if no handler accepted it
+        """
+        handler = self.Route(ticket)
+        if handler is not None:
+            _Synchronous(handler._Resolve(ticket), handler)
+        return handler
+
+    def RouteLevel(self, ticket):
+        """Find the support level the ticket would be handled at, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            int: Level of the accepting handler, or None if no handler accepts the ticket
+        """
+        handler = self.Route(ticket)
+        return None if handler is None else handler._level
+
+    def RouteMany(self, tickets, workers=None, chunk_size=1000, ordered=True):
+        """Route a stream of tickets in chunks across a process pool.
+
+        Tickets are consumed lazily and only a bounded number of chunks are in flight at once,
+        so arbitrarily large inputs can be routed in constant memory.
+
+        Args:
+            tickets (iterable): Ticket strings, or (ticket_id, ticket) pairs. Plain strings are identified by their position.
+            workers (int): Number of worker processes. Defaults to the number of cores, 0 routes in this process.
+            chunk_size (int): Number of tickets sent to a worker at a time.
+            ordered (bool): Yield results in input order, otherwise as each chunk completes.
+
+        Yields:
+            tuple: (ticket_id, handler_level) for every ticket
+        """
+        return _RouteMany(self, tickets, workers, chunk_size, ordered)
+
+class CachedTicketRouter():
+    """Memoizing front for a ticket router, so repeated tickets are only routed once.
+
+    Routing decisions are kept in a bounded LRU cache keyed on the normalised ticket text.
+    The cache is cleared whenever a chain is rebuilt with TicketHandler.SetSuccessor.
+    """
+    def __init__(self, router, max_size=4096, key=NormaliseTicket):
+        """Initialise empty cache in front of the router
+
+        Args:
+            router (TicketHandler or CompiledTicketRouter): Chain or compiled router making the real routing decisions
+            max_size (int): Maximum number of cached routing decisions
+            key (function): Maps a ticket to its cache key, e.g. HashTicket. Defaults to NormaliseTicket, None keys on the raw text.
+        """
+        self._router = router                           # Router making the real decisions
+        self._max_size = max_size                       # LRU bound
+        self._key = key                                 # Ticket normalisation
+        self._cache = OrderedDict()                     # Cache key -> handler, least recently used first
+        self._generation = TicketHandler._generation    # Chain generation the cache is valid for
+        self._hits = 0
+        self._misses = 0
+
+    def Route(self, ticket):
+        """Find the handler that accepts the ticket, from the cache where possible
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            TicketHandler: Handler that accepts the ticket, or None if no handler does
+        """
+        if self._generation != TicketHandler._generation:      # A chain has been rebuilt since the decisions were cached
+            self.Invalidate()
+        key = ticket if self._key is None else self._key(ticket)
+        try:
+            handler = self._cache[key]
+        except KeyError:
+            self._misses += 1
+            handler = self._router.Route(ticket)                # Make the real routing decision,
+            self._cache[key] = handler                          # remember it,
+            if len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)                 # and evict the least recently used decision.
+            return handler
+        self._hits += 1
+        self._cache.move_to_end(key)                            # Mark as most recently used
+        return handler
+
+    def RouteLevel(self, ticket):
+        """Find the support level the ticket would be handled at, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            int: Level of the accepting handler, or None if no handler accepts the ticket
+        """
+        handler = self.Route(ticket)
+        return None if handler is None else handler._level
+
+    def HandleTicket(self, ticket):
+        """Route the ticket and resolve it with the accepting handler
+
+        Args:
+            ticket (string): String description of support ticket
+
+        Returns:
+            TicketHandler: Handler that resolved the ticket, or None if no handler accepted it
+        """
+        handler = self.Route(ticket)
+        if handler is not None:
+            _Synchronous(handler._Resolve(ticket), handler)
+        return handler
+
+    def Rebuild(self, router):
+        """Replace the router and drop every cached decision
+
+        Args:
+            router (TicketHandler or CompiledTicketRouter): New chain or compiled router
+        """
+        self._router = router
+        self.Invalidate()
+
+    def Invalidate(self):
+        """Drop every cached routing decision"""
+        self._cache.clear()
+        self._generation = TicketHandler._generation
+
+    def GetStats(self):
+        """Get cache statistics
+
+        Returns:
+            dict: Hits, misses, current size and maximum size of the cache
+        """
+        return {"hits": self._hits, "misses": self._misses, "size": len(self._cache), "max_size": self._max_size}
+
+class RoutingRules():
+    """Declarative routing table of support levels, their keywords, their precedence and the fallback handler.
+
+    Tables are plain data, e.g. loaded from JSON:
+        {"levels": [{"level": 1, "keywords": ["error"], "precedence": 1}, ...],
+         "fallback": {"level": 0, "name": "customer management"}}
+
+    Keywords are matched as whole words, ignoring case, rather than anywhere in the ticket text.
+    """
+    def __init__(self, levels, fallback=None):
+        """Initialise and validate the table
+
+        Args:
+            levels (list): One dict per level with "level" (int), "keywords" (list of words), and optionally
+                "precedence" (int, lower wins where a ticket matches several levels, defaults to table order)
+                and "name" (string, defaults to "Level <level> support")
+            fallback (dict): "level" and optionally "name" of the handler given tickets no level matches, None for no fallback
+
+        Raises:
+            ValueError: If a level is repeated or a keyword is not a single word
+        """
+        self._levels = []
+        seen = set()
+        for order, rule in enumerate(levels):
+            level = rule["level"]
+            if level in seen:
+                raise ValueError(f'Level {level} is defined more than once')
+            seen.add(level)
+            keywords = []
+            for keyword in rule["keywords"]:
+                if _TOKEN.fullmatch(keyword) is None:
+                    raise ValueError(f'Keyword {keyword!r} of level {level} is not a single word')
+                keywords.append(keyword.lower())
+            self._levels.append({"level": level, "name": rule.get("name", f'Level {level} support'),
+                                 "keywords": keywords, "precedence": rule.get("precedence", order)})
+        self._levels.sort(key=lambda rule: rule["precedence"])     # Stable, so equal precedence keeps table order
+        self._fallback = None if fallback is None else {"level": fallback["level"], "name": fallback.get("name", f'Level {fallback["level"]} support')}
+
+    @classmethod
+    def FromDict(cls, table):
+        """Create rules from a table of the form described above
+
+        Args:
+            table (dict): Table with "levels" and optionally "fallback"
+
+        Returns:
+            RoutingRules: Rules of the table
+        """
+        return cls(table["levels"], table.get("fallback"))
+
+    @classmethod
+    def Load(cls, path):
+        """Create rules from a JSON file
+
+        Args:
+            path (path): JSON file holding a table of the form described above
+
+        Returns:
+            RoutingRules: Rules of the file
+        """
+        with open(path, encoding="utf-8") as file:
+            return cls.FromDict(json.load(file))
+
+    @classmethod
+    def FromChain(cls, chain):
+        """Create rules from the levels and keywords of an existing chain of keyword based handlers.
+
+        The rules match keywords as whole words ignoring case, while Level1, Level2 and Level3 match them anywhere
+        in the ticket text, so e.g. "errors" or "ERROR" is routed differently by the rules than by such a chain.
+
+        Args:
+            chain (TicketHandler): First handler of the chain
+
+        Returns:
+            RoutingRules: One level per keyword handler in chain order, and the chain's catch-all handler as the fallback
+
+        Raises:
+            ValueError: If a handler in the chain is neither keyword based nor a catch-all handler
+        """
+        levels = []
+        handler = chain
+        while handler is not None and not handler._catch_all:
+            if handler._keywords is None:
+                raise ValueError(f'{type(handler).__name__} is not keyword based and cannot be made into rules')
+            levels.append({"level": handler._level, "name": getattr(handler, "_name", f'Level {handler._level} support'), "keywords": list(handler._keywords)})
+            handler = handler._successor
+        fallback = None
+        if handler is not None:
+            default = "customer management" if handler._level == 0 else f'Level {handler._level} support'
+            fallback = {"level": handler._level, "name": getattr(handler, "_name", default)}
+        return cls(levels, fallback)
+
+    def ToDict(self):
+        """Get the table, levels in precedence order
+
+        Returns:
+            dict: Table with "levels" and "fallback", as accepted by FromDict
+        """
+        return {"levels": [dict(rule, keywords=list(rule["keywords"])) for rule in self._levels],
+                "fallback": None if self._fallback is None else dict(self._fallback)}
+
+    def BuildChain(self):
+        """Build a chain of handlers from the table, in precedence order and ending with the fallback handler
+
+        Returns:
+            RuleHandler: First handler of the chain, None if the table is empty
+        """
+        chain = None if self._fallback is None else RuleHandler(None, self._fallback["level"], self._fallback["name"])
+        for rule in reversed(self._levels):                         # Build from the end of the chain backwards
+            chain = RuleHandler(chain, rule["level"], rule["name"], rule["keywords"])
+        return chain
+
+class RuleHandler(TicketHandler):
+    """Ticket handler configured by one level of a RoutingRules table
+    """
+    def __init__(self, successor, level, name, keywords=None):
+        """Initialise handler from its level's rule
+
+        Args:
+            successor (TicketHandler): Ticket Handler to handle the request if not handled by current handler.
+            level (int): Support level reported for tickets accepted by this handler
+            name (string): Name of the support level, used in feedback
+            keywords (iterable): Lower case words accepted by this handler, None for a catch-all handler
+        """
+        super().__init__(successor)
+        self._level = level
+        self._name = name
+        self._keywords = None if keywords is None else tuple(dict.fromkeys(keywords))
+        self._catch_all = keywords is None
+        self._words = () if keywords is None else tuple((keyword, re.compile(rf'\b{re.escape(keyword)}\b').match) for keyword in self._keywords)    # (keyword, whole word match) pairs
+
+    def _HandleTicket(self, ticket):
+        """Private ticket handler
+
+        Args:
+            ticket (string): Ticket to be handled
+
+        Returns:
+            boolean: Ticket handled?
+        """
+        if self._Accepts(ticket):                                               # If the ticket contains any of this level's keywords,
+            self._Resolve(ticket)                                               # Resolve the ticket,
+            return True                                                         # Return true to indicate ticket has been handled
+        return False                                                            # Otherwise return false to indicate ticket has NOT been handled
+
+    def _Accepts(self, ticket):
+        """Private check of whether any word of the ticket is one of this handler's keywords
+
+        Args:
+            ticket (string): Ticket to be checked
+
+        Returns:
+            boolean: Ticket accepted?
+        """
+        if self._catch_all:
+            return True
+        lowered = ticket.lower()
+        return any(_FindWord(lowered, keyword, match) for keyword, match in self._words)
+
+    def Compile(self):
+        """Compile this chain of rule handlers into a rules router, which matches tickets as the chain does
+
+        Returns:
+            RulesTicketRouter: Router equivalent to this chain
+
+        Raises:
+            ValueError: If a handler in the chain is not a RuleHandler
+        """
+        handler = self
+        while handler is not None:
+            if not isinstance(handler, RuleHandler):
+                raise ValueError(f'{type(handler).__name__} does not match keywords as whole words and cannot be compiled with rule handlers')
+            handler = handler._successor
+        return RulesTicketRouter(RoutingRules.FromChain(self))
+
+    def _Resolve(self, ticket):
+        """Private resolution of an accepted ticket
+
+        Args:
+            ticket (string): Ticket to be resolved
+        """
+        events.Emit("HandleTicket", 'Support Ticket: "{ticket}" handled by {name}', ticket=ticket, level=self._level, name=self._name)    # Emit feedback event
+        # Handle Support Ticket here
+
+class RulesTicketRouter():
+    """Router driven by a RoutingRules table, which can be swapped while tickets are being routed.
+
+    The table is compiled into a list of keywords in precedence order. A ticket is lower cased once and each
+    keyword found with a C-level substring scan, checking its word boundaries only where it is found, so the
+    first keyword found gives the handler. Reloading compiles the new table to the side and then replaces it with a single
+    assignment, so routing never pauses, never sees a half-built table and never starts cold.
+    """
+    def __init__(self, rules):
+        """Compile the initial rules
+
+        Args:
+            rules (RoutingRules): Routing table
+        """
+        self._compiled = _CompiledRules(rules)
+
+    def Route(self, ticket):
+        """Find the handler the rules give the ticket to, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            RuleHandler: Handler that accepts the ticket, or None if no level matches and there is no fallback
+        """
+        return self._compiled.Route(ticket)     # Read once, so a concurrent reload applies to whole tickets only
+
+    def RouteLevel(self, ticket):
+        """Find the support level the ticket would be handled at, without resolving it
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            int: Level of the accepting handler, or None if no handler accepts the ticket
+        """
+        handler = self.Route(ticket)
+        return None if handler is None else handler._level
+
+    def HandleTicket(self, ticket):
+        """Route the ticket and resolve it with the accepting handler
+
+        Args:
+            ticket (string): String description of support ticket
+
+        Returns:
+            RuleHandler: Handler that resolved the ticket, or None if no handler accepted it
+        """
+        handler = self.Route(ticket)
+        if handler is not None:
+            _Synchronous(handler._Resolve(ticket), handler)
+        return handler
+
+    def Reload(self, rules):
+        """Atomically replace the routing table. If the new rules fail to compile, the current rules stay in use.
+
+        Args:
+            rules (RoutingRules): New routing table
+        """
+        compiled = _CompiledRules(rules)        # Compile fully before anything sees it,
+        self._compiled = compiled               # then swap it in with a single assignment.
+        TicketHandler._generation += 1          # Invalidate routing decisions cached for the old rules
+
+    def ReloadFile(self, path):
+        """Atomically replace the routing table with one read from a JSON file, see Reload
+
+        Args:
+            path (path): JSON file holding the new table
+        """
+        self.Reload(RoutingRules.Load(path))
+
+    def GetRules(self):
+        """Get the rules currently in use
+
+        Returns:
+            RoutingRules: Routing table
+        """
+        return self._compiled._rules
+
+    def RouteMany(self, tickets, workers=None, chunk_size=1000, ordered=True):
+        """Route a stream of tickets with the current rules across a process pool, see CompiledTicketRouter.RouteMany
+
+        Returns:
+            generator: (ticket_id, handler_level) results
+        """
+        return _RouteMany(self, tickets, workers, chunk_size, ordered)
+
+class _CompiledRules():
+    """Immutable keyword index of one RoutingRules table.
+
+    Small tables are routed by scanning for each keyword in turn, which runs in C and beats tokenising the
+    ticket. Past _SCAN_KEYWORDS keywords that cost grows with the table, so the ticket is tokenised once and
+    its words intersected with a hash index of the keywords instead, whose cost does not grow with the table.
+    """
+    def __init__(self, rules):
+        """Build the handlers and the keyword index
+
+        Args:
+            rules (RoutingRules): Routing table
+        """
+        self._rules = rules
+        table = {}                                          # Keyword -> (whole word match, handler), best precedence kept
+        self._ranks = {}                                    # Keyword -> precedence rank of its best level
+        handler = rules.BuildChain()
+        rank = 0
+        while handler is not None and not handler._catch_all:
+            for keyword, match in handler._words:
+                if keyword not in table:                    # Levels are visited best first
+                    table[keyword] = (match, handler)
+                    self._ranks[keyword] = rank
+            handler = handler._successor
+            rank += 1
+        self._table = tuple((keyword, match, handler) for keyword, (match, handler) in table.items())
+        self._handlers = {keyword: handler for keyword, (_, handler) in table.items()}     # Keyword -> handler of its best level
+        self._scan = len(self._table) <= _SCAN_KEYWORDS     # Whether to route by scanning rather than by the index
+        self._fallback = handler                            # Catch-all handler, or None
+
+    def Route(self, ticket):
+        """Find the handler with the best precedence among the ticket's keywords
+
+        Args:
+            ticket (string): Ticket to be routed
+
+        Returns:
+            RuleHandler: Accepting handler, or the fallback handler if no keyword matches
+        """
+        lowered = ticket.lower()
+        if self._scan:
+            for keyword, match, handler in self._table:    # Keywords in precedence order, so the first found wins
+                if _FindWord(lowered, keyword, match):
+                    return handler
+            return self._fallback
+        found = self._ranks.keys() & set(_TOKEN.findall(lowered))  # Hash lookup of every word at once
+        if not found:
+            return self._fallback
+        return self._handlers[min(found, key=self._ranks.__getitem__)]
+
+def _FindWord(text, keyword, match):
+    """Check whether keyword occurs in text as a whole word
+
+    Args:
+        text (string): Lower cased ticket
+        keyword (string): Lower cased keyword
+        match (function): Match method of the keyword's whole word pattern
+
+    Returns:
+        boolean: Keyword found as a whole word?
+    """
+    index = text.find(keyword)                  # C-level substring scan,
+    while index >= 0:
+        if match(text, index):                  # with the word boundaries only checked where it is found
+            return True
+        index = text.find(keyword, index + 1)
+    return False
+
+def HashTicket(ticket):
+    """Cache key storing a fixed size digest of the normalised ticket rather than the full ticket text
+
+    Args:
+        ticket (string): Ticket to be hashed
+
+    Returns:
+        bytes: 128-bit digest of the normalised ticket
+    """
+    return hashlib.blake2b(NormaliseTicket(ticket).encode("utf-8"), digest_size=16).digest()
+
+_worker_router = None   # Router installed in each worker process
+
+def _InitRouteWorker(router):
+    """Install the router in a worker process so it is sent once rather than with every chunk"""
+    global _worker_router
+    _worker_router = router
+
+def _RouteChunk(chunk, router=None):
+    """Route a chunk of (ticket_id, ticket) pairs
+
+    Returns:
+        list: (ticket_id, handler_level) results
+    """
+    router = router or _worker_router
+    return [(ticket_id, router.RouteLevel(ticket)) for ticket_id, ticket in chunk]
+
+def _RouteMany(router, tickets, workers, chunk_size, ordered):
+    """Route a stream of tickets in chunks, in this process or across a process pool, see CompiledTicketRouter.RouteMany"""
+    chunks = _Chunks(tickets, chunk_size)
+    if workers == 0:                                                            # Route in this process
+        for chunk in chunks:
+            yield from _RouteChunk(chunk, router)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_InitRouteWorker, initargs=(router,)) as executor:
+        pending = deque() if ordered else set()
+        for chunk in chunks:
+            if len(pending) >= 2 * workers:                                     # Bound the work in flight
+                yield from _Collect(pending, ordered)
+            future = executor.submit(_RouteChunk, chunk)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+        while pending:                                                          # Drain the remaining chunks
+            yield from _Collect(pending, ordered)
+
+def _Chunks(tickets, chunk_size):
+    """Lazily split tickets into lists of (ticket_id, ticket) pairs"""
+    pairs = ((index, ticket) if isinstance(ticket, str) else ticket for index, ticket in enumerate(tickets))
+    while True:
+        chunk = list(islice(pairs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _Collect(pending, ordered):
+    """Wait for the next finished chunk(s) and return their results"""
+    if ordered:
+        return pending.popleft().result()                                           # Oldest chunk first
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)                            # Whichever chunks finished first
+    pending.difference_update(done)
+    return [result for future in done for result in future.result()]
+
+def ReadTicketsJSONL(path, id_key="id", ticket_key="ticket"):
+    """Lazily read (ticket_id, ticket) pairs from a JSON lines file
+
+    Args:
+        path (path): JSON lines file with one ticket object per line
+        id_key (string): Key of the ticket id
+        ticket_key (string): Key of the ticket text
+
+    Yields:
+        tuple: (ticket_id, ticket)
+    """
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record[id_key], record[ticket_key]
+
 """ Client """
 if __name__ == "__main__":
     support_ticket_handler = Level1(Level2(Level3(DefaultHandler(None))))       # Setting up order of event handlers (Chain of Responsibilities)
@@ -110,4 +1037,35 @@ if __name__ == "__main__":
     support_ticket_handler.HandleTicket(simple_ticket)
     support_ticket_handler.HandleTicket(moderate_ticket)
     support_ticket_handler.HandleTicket(complex_ticket)
-    support_ticket_handler.HandleTicket(undefined_ticket)
\ No newline at end of file
+    support_ticket_handler.HandleTicket(undefined_ticket)
+
+    """ Handling support tickets with the compiled router """
+    compiled_router = support_ticket_handler.Compile()
+    compiled_router.HandleTicket(simple_ticket)
+    compiled_router.HandleTicket(moderate_ticket)
+    compiled_router.HandleTicket(complex_ticket)
+    compiled_router.HandleTicket(undefined_ticket)
+
+    """ Routing a batch of support tickets across a process pool """
+    tickets = [simple_ticket, moderate_ticket, complex_ticket, undefined_ticket]
+    for ticket_id, level in support_ticket_handler.RouteMany(tickets, workers=2):
+        print(f'Support Ticket {ticket_id} routed to level {level}')
+
+    """ Handling a storm of duplicate support tickets through a routing cache """
+    cached_router = CachedTicketRouter(compiled_router, max_size=128, key=HashTicket)
+    for _ in range(1000):
+        cached_router.RouteLevel(simple_ticket)
+    print(f'Routing cache statistics: {cached_router.GetStats()}')
+
+    """ Handling support tickets with a hot-reloadable rules table """
+    rules_router = RulesTicketRouter(RoutingRules.FromChain(support_ticket_handler))
+    rules_router.HandleTicket(simple_ticket)
+    rules_router.HandleTicket(undefined_ticket)
+    table = rules_router.GetRules().ToDict()
+    table["levels"][1]["keywords"].append("broken")                          # Route broken equipment to Level 2 from now on
+    rules_router.Reload(RoutingRules.FromDict(table))
+    rules_router.HandleTicket(undefined_ticket)
+
+    """ Handling support tickets through an asyncio pipeline """
+    pipeline = AsyncTicketPipeline(support_ticket_handler, workers=2, queue_size=10)
+    print(f'Pipeline results: {asyncio.run(pipeline.Run(tickets))}')
\ No newline at end of file